@@ -1,17 +1,27 @@
-from .hardware.camera import Camera, CameraSchedule
-from .services import CameraStream, FileStream
-from .utilities.exposure import Exposure
-from .utilities.drift_align import DriftAlign
-from .utilities.filemanager import FileManager
+import importlib
 
-__all__ = [
-    "Camera",
-    "Capture",
-    "Exposure",
-    "DriftAlign",
-    "FileManager",
-    "Camera",
-    "CameraSchedule",
-    "CameraStream",
-    'FileStream'
-]
+# Public names and the submodule defining each, imported on first access
+# so that e.g. `from Astro.hardware import Camera` does not pull in cv2 or astropy
+_EXPORTS = {
+    "Camera": ".hardware.camera",
+    "CameraSchedule": ".hardware.camera",
+    "CameraStream": ".services.capture",
+    "FileStream": ".services.capture",
+    "Exposure": ".utilities.exposure",
+    "DriftAlign": ".utilities.drift_align",
+    "FileManager": ".utilities.filemanager",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -4,23 +4,226 @@ import re
 import shlex
 import time
 import signal
+import fcntl
+import math
+import select
+import threading
+from typing import Optional
+
+# Linux fcntl command for resizing a pipe (not exposed by older Pythons)
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+PIPE_SIZE = 1 << 20
+# Python-side buffer on the stream pipes, only the start-up peek goes through it
+# since CameraStream then reads the stdout fd directly
+STREAM_BUFFER = 1 << 16
+
+# Setting path, current value and choice lines of gphoto2 --list-all-config
+CONFIG_LINE_RE = re.compile(
+    r"^(?:/.*/(?P<title>[^/\n]+)"
+    r"|Current:(?P<current>.*)"
+    r"|Choice:[ \t]*\d+(?P<choice>.*))$",
+    re.M,
+)
+# Terminator gphoto2 prints after each --get-config block
+CONFIG_END_RE = re.compile(r"^END$", re.M)
+# Seconds a --get-config result is reused before asking the camera again
+CONFIG_CACHE_TTL = 2.0
+# Raw file names reported by gphoto2 captures
+CR3_RE = re.compile(r'(\w+\.CR3)')
+# Local name gphoto2 reports after downloading a capture
+SAVED_CR3_RE = re.compile(r'^Saving file as (\S+\.CR3)', re.M)
+# One line per exposure of a burst: the local name if downloaded, else the name on the card
+BURST_CR3_RE = re.compile(r'^(?:Saving file as|FILEADDED) (\S+\.CR3)', re.M)
+# Seconds to wait before trying to start the gphoto2 shell again after it failed
+SHELL_RETRY_S = 30.0
+# gphoto2 command line options with an equivalent gphoto2 --shell command
+SHELL_COMMANDS = {
+    "--get-config": "get-config",
+    "--set-config": "set-config",
+}
+
+
+def shell_commands(args: list) -> Optional[list]:
+    """
+    Translate gphoto2 command line options into gphoto2 --shell commands.
+
+    Args:
+        args: gphoto2 arguments, e.g. ["--get-config=iso", "--set-config", "iso=100"]
+
+    Returns:
+        List of shell command lines, or None if any option has no shell equivalent
+    """
+    lines = []
+    i = 0
+    while i < len(args):
+        option, sep, value = args[i].partition("=")
+        if option not in SHELL_COMMANDS:
+            return None
+        if not sep:
+            i += 1
+            if i == len(args):
+                return None
+            value = args[i]
+        if not value or any(c.isspace() for c in value):
+            return None
+        lines.append(f"{SHELL_COMMANDS[option]} {value}")
+        i += 1
+
+    return lines
+
+
+def drain(pipe):
+    """Read and discard a pipe until it closes."""
+    try:
+        while pipe.read1(65536):
+            pass
+    except (OSError, ValueError):
+        pass
+
+
+class GPhotoShell:
+    """Long-lived gphoto2 --shell process, avoiding a fork and camera init per command."""
+
+    PROMPT_RE = re.compile(rb"gphoto2: \{[^}\n]*\} [^\n]*> $")
+
+    def __init__(self, timeout: float = 30.0):
+        """
+        Start the shell and wait for its first prompt.
+
+        Args:
+            timeout: Maximum time in seconds to wait for a command to finish
+        """
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.process = subprocess.Popen(
+            ["gphoto2", "--shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            start_new_session=True,
+        )
+        try:
+            self._read_until_prompt(5.0)
+        except Exception:
+            self.close()
+            raise
+
+    def run(self, lines: list) -> str:
+        """
+        Run shell commands in order and return their combined output.
+
+        Raises:
+            Exception: If gphoto2 reports an error
+        """
+        output = []
+        with self.lock:
+            for line in lines:
+                self.process.stdin.write(line.encode() + b"\n")
+                result = self._read_until_prompt(self.timeout).decode(errors="replace")
+                # Drop the echoed command line if the shell repeats it
+                if result.startswith(line):
+                    result = result[len(line):].lstrip("\r\n")
+                if "*** Error" in result:
+                    raise Exception("Could not connect to camera")
+                output.append(result)
+
+        return "".join(output)
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write(b"exit\n")
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+    def _read_until_prompt(self, timeout: float) -> bytes:
+        fd = self.process.stdout.fileno()
+        output = bytearray()
+        deadline = time.monotonic() + timeout
+        while True:
+            prompt = self.PROMPT_RE.search(output)
+            if prompt is not None:
+                return bytes(output[: prompt.start()])
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise TimeoutError("gphoto2 shell did not respond")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError("gphoto2 shell exited")
+            output.extend(chunk)
 
 
 class Camera:
     def __init__(self):
         self.config = dict()
         self.stream = None
+        self._cache: dict[str, tuple[float, str]] = {}
+        self.bulb_mode = False
+        self.bulb_time = None
+        # Config reads and writes go through a persistent gphoto2 --shell when possible
+        self.use_shell = True
+        self._shell: Optional[GPhotoShell] = None
+        self._shell_retry_at = 0.0  # monotonic time before which the shell isn't restarted
+        # One process can hold the camera at a time. Shared by the web server's request
+        # threads, so starting, using and closing the shell and running gphoto2 take turns.
+        self.lock = threading.RLock()
+
+    def command(self, command) -> str:
+        # Accept an option string or an already split argument list
+        args = shlex.split(command) if isinstance(command, str) else list(command)
+        if any(arg.startswith("--set-config") for arg in args):
+            self._cache.clear()  # cached settings may no longer be current
+
+        with self.lock:
+            lines = shell_commands(args)
+            if lines is not None and self._open_shell():
+                try:
+                    return self._shell.run(lines)
+                except (OSError, EOFError, TimeoutError) as e:
+                    # Shell died or hung, run this command on its own, the next one reopens it
+                    print(f"Warning: gphoto2 shell failed, running command as its own process: {e}")
+                    self.close_shell()
+
+            # Only one process can hold the camera, release the shell first
+            self.close_shell()
+            command = ["gphoto2"] + args
+            result = subprocess.run(command,
+                                    capture_output=True,
+                                    text=True,
+                                    start_new_session=True)
+            if result.returncode == 0:
+                return result.stdout
+            else:
+                raise Exception("Could not connect to camera")
+
+    def _open_shell(self) -> bool:
+        with self.lock:
+            if self._shell is not None:
+                return True
+            if not self.use_shell or time.monotonic() < self._shell_retry_at:
+                return False
+
+            try:
+                self._shell = GPhotoShell()
+            except (OSError, EOFError, TimeoutError) as e:
+                # Back off rather than give up, the camera may only have been busy
+                print(
+                    f"Warning: gphoto2 shell unavailable, using one process per command "
+                    f"for {SHELL_RETRY_S:.0f}s: {e}"
+                )
+                self._shell_retry_at = time.monotonic() + SHELL_RETRY_S
+                return False
+            return True
 
-    def command(self, command: str) -> str:
-        command = ["gphoto2"] + shlex.split(command)
-        result = subprocess.run(command,
-                                capture_output=True,
-                                text=True,
-                                preexec_fn=os.setpgrp)
-        if result.returncode == 0:
-            return result.stdout
-        else:
-            raise Exception("Could not connect to camera")
+    def close_shell(self):
+        with self.lock:
+            if self._shell is not None:
+                self._shell.close()
+                self._shell = None
 
     def is_on(self):
         try:
@@ -33,22 +236,48 @@ class Camera:
         result = self.command(f"--set-config {setting}={value}")
         if setting == "shutterspeed":  # update bulb mode
             self.bulb_mode = value == "bulb"
+            if not self.bulb_mode:
+                self.bulb_time = None
         return result
 
+    def _get_config_blocks(self, settings) -> dict:
+        """Fetch the --get-config output of each setting in one gphoto2 call."""
+        now = time.monotonic()
+        blocks = dict()
+        missing = []
+        for setting in settings:
+            cached = self._cache.get(setting)
+            if cached is not None and now - cached[0] < CONFIG_CACHE_TTL:
+                blocks[setting] = cached[1]
+            else:
+                missing.append(setting)
+
+        if missing:
+            result = self.command(" ".join(f"--get-config={setting}" for setting in missing))
+            for setting, block in zip(missing, CONFIG_END_RE.split(result)):
+                self._cache[setting] = (now, block)
+                blocks[setting] = block
+
+        return blocks
+
     def get(self, setting):
-        result = self.command(f"--get-config={setting}").split('\n')
+        return self.get_many([setting])[setting]
 
-        for line in result:
-            if len(line) == 0:
-                continue
-            line = line.split()
-            if line[0] == "Current:":
-                return line[1]
+    def get_many(self, settings) -> dict:
+        values = dict()
+        for setting, block in self._get_config_blocks(settings).items():
+            for line in block.split('\n'):
+                line = line.split()
+                if len(line) > 1 and line[0] == "Current:":
+                    values[setting] = line[1]
+                    break
+            else:
+                values[setting] = None
 
-        return None
+        return values
 
     def list(self, setting):
-        result = self.command(f"--get-config={setting}").split('\n')
+        result = self._get_config_blocks([setting])[setting].split('\n')
         for line in result:
             line = line.split(" ")
             if line[0] == "Choice:":
@@ -61,162 +290,236 @@ class Camera:
 
     def get_config(self):
         result = self.command("--list-all-config")
-        entries = result.split("END")
         config = dict()
-        for entry in entries:
-            lines = entry.split("\n")
-            title = ""
-            current = ""
-            choices = []
-            for line in lines:
-                if len(line) == 0:
-                    continue
-
-                if line.startswith("/"):
-                    title = line.split("/")[-1]
-
-                else:
-                    line = line.split(":")
-                    if line[0] == "Current":
-                        current = line[1].strip()
-                    elif line[0] == "Choice":
-                        choice = line[1].strip()
-                        i = choice.find(" ")
-                        choice = choice[i:].split()
-                        choice = " ".join(choice)
-                        choices.append(choice)
-            if title == "":
+        entry = None
+        for match in CONFIG_LINE_RE.finditer(result):
+            title, current, choice = match.groups()
+            if title is not None:
+                entry = config[title] = {"Current": "", "Choices": []}
+            elif entry is None:
                 continue
-
-            config[title] = {"Current": current, "Choices": choices}
+            elif current is not None:
+                entry["Current"] = current.strip()
+            else:
+                entry["Choices"].append(" ".join(choice.split()))
         self.config = config
 
         return self.config
 
+    def set_bulb(self, seconds):
+        """Use bulb exposures of the given length for subsequent captures."""
+        self.bulb_time = seconds
+        if not self.bulb_mode:
+            self.set("shutterspeed", "bulb")
+
+    def _bulb_prefix(self) -> list:
+        # Skip the USB round trip when the camera is already in bulb mode
+        if self.bulb_mode:
+            return ["--keep"]
+        return ["--set-config", "shutterspeed=bulb", "--keep"]
+
+    def _bulb_exposure(self, download) -> list:
+        if float(self.bulb_time).is_integer():
+            wait = f"{int(self.bulb_time)}s"
+        else:
+            wait = f"{int(self.bulb_time * 1000)}ms"
+        return [
+            "--set-config", "eosremoterelease=Immediate",
+            f"--wait-event={wait}",
+            "--set-config", "eosremoterelease=Release Full",
+            "--wait-event-and-download=2s" if download else "--wait-event=2s",
+        ]
+
     def capture(self, download=True):
-        # if self.bulb_mode and isinstance(self.bulb_time, int):
-        #     command = "--set-config shutterspeed=bulb"
-        #     command += " --keep"
-        #     command += " --set-config eosremoterelease=Immediate"
-        #     command += f" --wait-event={self.bulb_time}s"
-        #     command += " --set-config eosremoterelease=\"Release Full\""
-        #     command += " --wait-event-and-download=2s" if self.download else " --wait-event=2s"
-        # else:
-        if download:
+        if self.bulb_time is not None:
+            command = self._bulb_prefix() + self._bulb_exposure(download)
+        elif download:
             command = "--capture-image-and-download --keep"
         else:
             command = "--capture-image --keep"
 
         result = self.command(command)
-        return re.search(r'(\w+\.CR3)', result).group(1)
+        if self.bulb_time is not None:
+            self.bulb_mode = True
+        # The download line names the local file, otherwise take the name on the card
+        match = SAVED_CR3_RE.search(result) or CR3_RE.search(result)
+        return match.group(1)
+
+    def capture_burst(self, count, download_every=1, first=0):
+        """
+        Take several bulb exposures in a single gphoto2 invocation.
+
+        Args:
+            count: Number of exposures
+            download_every: Download every n-th exposure, counted from exposure 0.
+                None keeps every exposure on the card only.
+            first: Number of this burst's first exposure, so the download cadence
+                carries on across consecutive bursts
+
+        Returns:
+            List of CR3 filenames reported by gphoto2, one per exposure in capture order
+        """
+        if self.bulb_time is None:
+            raise Exception("Bulb time not set, call set_bulb first")
+
+        command = self._bulb_prefix()
+        for i in range(count):
+            download = download_every is not None and (first + i) % download_every == 0
+            command += self._bulb_exposure(download)
+
+        result = self.command(command)
+        self.bulb_mode = True
+        # Other lines name the same files again, and a frame may be reported on two lines
+        names = BURST_CR3_RE.findall(result) or CR3_RE.findall(result)
+        return list(dict.fromkeys(names))
 
     def download_latest(self):
         # Get list of files
-        result = subprocess.run(["gphoto2", "--list-files"], capture_output=True, text=True)
+        result = self.command("--list-files")
 
-        # Parse the output to find the last file number
-        lines = result.stdout.strip().split("\n")
-        last_file = None
-        for line in lines:
-            if line.startswith("#"):
-                last_file = line
+        # The newest file is listed last, search from the end
+        lines = result.rstrip().split("\n")
+        last_file = next((line for line in reversed(lines) if line.startswith("#")), None)
 
         # Download the latest image
         success = False
         if last_file:
             file = last_file.split()[0].replace("#", "")
-            result = subprocess.run(
-                ["gphoto2", "--get-file", file], input="n\nn\n", capture_output=True, text=True
-            )
-            success = result.stdout.strip().split()[0] == "Saving"
+            with self.lock:
+                self.close_shell()
+                result = subprocess.run(
+                    ["gphoto2", "--get-file", file],
+                    input="n\nn\n",
+                    capture_output=True,
+                    text=True,
+                )
+            success = result.stdout.lstrip().startswith("Saving")
 
         # Success is false if it already exists on the pc
         return success
 
     def start_stream(self):
-        # Check if stream exists and is still running
-        if self.stream is not None:
+        with self.lock:
+            # Check if stream exists and is still running
+            if self.stream is not None:
+                return self.stream
+
+            # Live view needs the camera to itself
+            self.close_shell()
+
+            # Start new stream process
+            stream = subprocess.Popen(
+                    ['gphoto2', '--capture-movie', '--stdout'],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    bufsize=STREAM_BUFFER,
+                    start_new_session=True,
+                )
+            # Enlarge the kernel pipe buffer so gphoto2 can write whole frames
+            try:
+                fcntl.fcntl(stream.stdout.fileno(), F_SETPIPE_SZ, PIPE_SIZE)
+            except (AttributeError, OSError):
+                pass
+            time.sleep(0.5)
+            stdout = stream.stdout.peek(1024)
+            if b'debug' in stdout:
+                stream.kill()
+                self.stream = None
+                raise Exception("Turn on camera")
+
+            # Nothing reads stderr, discard it so a full pipe never blocks gphoto2
+            threading.Thread(target=drain, args=(stream.stderr,), daemon=True).start()
+
+            self.stream = stream
             return self.stream
 
-        # Start new stream process
-        stream = subprocess.Popen(
-                ['gphoto2', '--capture-movie', '--stdout'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=10**8
-            )
-        time.sleep(0.5)
-        stdout = stream.stdout.peek(1024)
-        if b'debug' in stdout:
-            stream.kill()
-            self.stream = None
-            raise Exception("Turn on camera")
-        self.stream = stream
-        return self.stream
-
     def end_stream(self):
-        if self.stream is None:
-            return True
+        with self.lock:
+            if self.stream is None:
+                return True
 
-        # Send SIGINT for graceful shutdown
-        self.stream.send_signal(signal.SIGINT)
+            # Send SIGINT for graceful shutdown
+            self.stream.send_signal(signal.SIGINT)
 
-        try:
-            # Wait up to 2 seconds for graceful exit
-            self.stream.wait(timeout=2)
-        except subprocess.TimeoutExpired:
-            # If still running after timeout, force kill
-            self.stream.kill()
-            self.stream.wait()
+            try:
+                # Wait up to 2 seconds for graceful exit
+                self.stream.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                # If still running after timeout, force kill
+                self.stream.kill()
+                self.stream.wait()
 
-        self.stream = None
+            self.stream = None
 
-        # Give camera a moment to reset
-        time.sleep(0.5)
+            # Give camera a moment to reset
+            time.sleep(0.5)
 
-        try:
-            self.command("--set-config eosremoterelease=4")
-            return True
-        except Exception as e:
-            print(f"Warning: Could not reset camera release mode: {e}")
-            return False
+            try:
+                self.command("--set-config eosremoterelease=4")
+                return True
+            except Exception as e:
+                print(f"Warning: Could not reset camera release mode: {e}")
+                return False
 
 
 class CameraSchedule:
     def __init__(self, camera: Camera):
         self.camera: Camera = camera
-        self.interrupt = False
+        # Set from Ctrl+C or any other thread to stop after the current exposure
+        self.interrupt = threading.Event()
         camera.schedule = self
 
     def end(self, *args):
-        self.interrupt = True
-
-    def run(self, exposure_duration, download_period_s=None):
+        self.interrupt.set()
+
+    def run(self, exposure_duration, download_period_s=None, burst=1):
+        """
+        Take exposures until interrupted with Ctrl+C.
+
+        Args:
+            exposure_duration: Bulb exposure length in seconds
+            download_period_s: Minimum seconds between downloaded exposures, None to never download
+            burst: Exposures per gphoto2 invocation. Larger bursts save a process
+                start per frame but only check for Ctrl+C between bursts.
+        """
         # Setup camera
         self.camera.set_bulb(exposure_duration)
 
         # Admin
-        last_download_time = 0
-        self.interrupt = False
+        next_download = time.monotonic()  # monotonic, so clock steps don't skew the cadence
+        self.interrupt.clear()
         signal.signal(signal.SIGINT, self.end)
 
+        # In bursts, download on a fixed exposure count matching the period, counted
+        # across bursts so the cadence doesn't restart with each one
+        taken = 0
+        download_every = None
+        if download_period_s is not None:
+            download_every = max(1, math.ceil(download_period_s / exposure_duration))
+
         # Loop until interrupted
-        while not self.interrupt:
+        while not self.interrupt.is_set():
             # print current time
             print(f"{time.asctime()} > ", end="", flush=True)
 
+            if burst > 1:
+                self.camera.capture_burst(burst, download_every, first=taken)
+                taken += burst
+                continue
+
             # set download if triggered
+            download = False
             if download_period_s is not None:
-                now = time.time()
-                if now - last_download_time > download_period_s:
-                    self.camera.download = True
-                    last_download_time = now
+                now = time.monotonic()
+                if now >= next_download:
+                    download = True
+                    # Advance from the deadline rather than now so lateness doesn't accumulate
+                    next_download += download_period_s
+                    if next_download <= now:
+                        next_download = now + download_period_s
 
             # take exposure
-            self.camera.capture()
-
-            # remove download
-            self.camera.download = False
+            self.camera.capture(download=download)
 
         # Remove interrupt handler
         signal.signal(signal.SIGINT, signal.SIG_IGN)
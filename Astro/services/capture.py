@@ -1,12 +1,34 @@
 from ..hardware.camera import Camera
 import cv2
 import numpy as np
+import atexit
 import threading
-import queue
+import sys
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 from abc import ABC, abstractmethod
 from ..utilities.filemanager import FileManager
-import rawpy
+from ..utilities.jpeg import encode_jpeg, turbojpeg
+# Lives in its own module so spawned decode workers import only what it needs
+from ..utilities.preview import decode_preview
+
+try:
+    from turbojpeg import TJPF_BGR
+except ImportError:
+    TJPF_BGR = None  # only used with the decoder from turbojpeg()
+
+# Maximum number of bytes taken from the gphoto2 pipe per read
+READ_CHUNK_SIZE = 1 << 20
+# Worker processes decoding raw files for FileStream
+RAW_DECODE_WORKERS = 2
+# Seconds between repeats of an unchanged image on the file stream
+FILE_HEARTBEAT_S = 5
+# Initial size of the reader's circular buffer, grown if a frame outgrows it
+STREAM_BUFFER_SIZE = 4 << 20
+# Number of decode buffers kept for reuse between frames
+FRAME_POOL_SIZE = 4
 
 
 class Stream(ABC):
@@ -21,20 +43,54 @@ class Stream(ABC):
 
     def generate(self):
         """Generator function for video streaming."""
+        last_frame = None
+        part = None
         while self.running:
             frame = self.get_bytes()
             if frame is None:
                 continue
 
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            if not ret:
-                continue
+            # Only encode frames that changed, get_bytes may hand back the same cached image
+            if frame is not last_frame:
+                frame_bytes = encode_jpeg(frame, quality=85)
+                if frame_bytes is None:
+                    continue
 
-            frame_bytes = buffer.tobytes()
+                part = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
+                last_frame = frame
 
             # Yield frame in multipart format
-            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n")
+            yield part
+
+
+# Shared by every FileStream, started on the first decode and shut down at exit. One stream
+# stopping leaves it running for the others.
+_decode_pool: Optional[ProcessPoolExecutor] = None
+_decode_pool_lock = threading.Lock()
+
+
+def _get_decode_pool() -> ProcessPoolExecutor:
+    """Get the raw decode worker pool, starting it on first use."""
+    global _decode_pool
+    with _decode_pool_lock:
+        if _decode_pool is None:
+            # rawpy's OpenMP build can deadlock in forked children, so spawn them
+            _decode_pool = ProcessPoolExecutor(
+                max_workers=RAW_DECODE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _decode_pool
+
+
+def shutdown_decode_pool():
+    """Stop the raw decode worker processes, a later decode starts new ones."""
+    global _decode_pool
+    with _decode_pool_lock:
+        if _decode_pool is not None:
+            _decode_pool.shutdown(wait=False, cancel_futures=True)
+            _decode_pool = None
+
+
+atexit.register(shutdown_decode_pool)
 
 
 class FileStream(Stream):
@@ -43,42 +99,49 @@ class FileStream(Stream):
         self.files = filemanager
         self.last_file = None
         self.cached_image = None
+        # One decode per new file however many clients are watching
+        self._decode_lock = threading.Lock()
 
     def get_bytes(self):
-        import time
-
-        file = self.files.get_latest()
+        # Sleep until watchdog reports a new file, the timeout re-sends the cached frame
+        # as a heartbeat so idle connections stay open
+        last = self.last_file if self.cached_image is not None else None
+        file = self.files.wait_for_change(last, timeout=FILE_HEARTBEAT_S)
 
         # If same file, return cached image
         if file == self.last_file and self.cached_image is not None:
-            time.sleep(0.1)  # Small sleep to prevent busy-wait
             return self.cached_image
 
-        # File changed or no cache, process it
+        # No files yet
         if file is None:
-            time.sleep(1)  # Wait longer when no files available
             return None
 
-        with rawpy.imread(file) as raw:
-            image = raw.postprocess()
-
-        height, width = image.shape[:2]
-        if width > 1920:
-            scale = 1920 / width
-            new_width = 1920
-            new_height = int(height * scale)
-            image_resized = cv2.resize(image, (new_width, new_height))
-        else:
-            image_resized = image
+        with self._decode_lock:
+            # Another client may have decoded it while we waited
+            if file == self.last_file and self.cached_image is not None:
+                return self.cached_image
 
-        image_bgr = cv2.cvtColor(image_resized, cv2.COLOR_RGB2BGR)
+            # Decode in a worker process so the request threads keep serving
+            image_bgr = _get_decode_pool().submit(decode_preview, file).result()
 
-        # Cache the result
-        self.last_file = file
-        self.cached_image = image_bgr
+            # Cache the result
+            self.cached_image = image_bgr
+            self.last_file = file
 
         return image_bgr
 
+    def stop(self):
+        """Stop streaming. The shared decode workers keep running for other streams."""
+        self.running = False
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit."""
+        self.stop()
+
 
 class CameraStream(Stream):
     """Handles gphoto2 camera live view stream capture."""
@@ -92,14 +155,31 @@ class CameraStream(Stream):
         """
         super().__init__()
         self.camera = camera
-        self.frame_queue = queue.Queue(2)
         self.running = False
         self.process = None
         self.stream_thread = None
+        # Latest-wins slot: the reader rebinds it and notifies _frame_cond
+        self.latest_jpeg: Optional[bytes] = None
+        # Decoded only when a consumer asks for pixels, cached until the next JPEG
         self.latest_frame = None
-        self.frame_lock = threading.Lock()
         self.state_lock = threading.Lock()
 
+        # libjpeg-turbo decoder, falls back to cv2.imdecode if unavailable
+        self._tj = turbojpeg()
+        self._frame_shape = None
+        self._frame_pool = []
+        self._pool_lock = threading.Lock()
+
+        # Decoding runs on the consumer's thread so a slow frame never stalls the pipe.
+        # Each consumer waits for a sequence number newer than the last it took, so
+        # one consumer taking a frame never hides it from the others.
+        self._frame_cond = threading.Condition()
+        self._decode_lock = threading.Lock()
+        self._published_seq = 0
+        self._decoded_seq = 0
+        # Last sequence number get_frame returned, per calling thread
+        self._consumer = threading.local()
+
     def start(self):
         with self.state_lock:
             if self.running:
@@ -119,6 +199,13 @@ class CameraStream(Stream):
                 self.process = None
                 raise Exception(f"Stream failed to start camera video: {e}")
 
+            # Drop any frame left over from a previous session
+            self.latest_frame = None
+            with self._frame_cond:
+                self.latest_jpeg = None
+                self._published_seq = 0
+                self._decoded_seq = 0
+
             # Start stream reading thread
             self.running = True
             self.stream_thread = threading.Thread(target=self._read_mjpeg_stream, daemon=True)
@@ -155,93 +242,282 @@ class CameraStream(Stream):
 
         print("Camera stream stopped")
 
-    def get_bytes(self) -> Optional[np.ndarray]:
+    def is_running(self) -> bool:
+        """Whether the stream has been started and not stopped."""
+        return self.running
+
+    def generate(self):
         """
-        Get the next frame from the queue.
+        Generator function for video streaming.
 
-        Args:
-            timeout: Maximum time to wait for a frame
+        Yields the JPEGs exactly as gphoto2 sent them, so frames are never
+        re-encoded no matter how many clients are watching.
+        """
+        seen = 0
+        while self.running:
+            jpg, seen = self._wait_for_jpeg(seen, timeout=1.0)
+            if jpg is None:
+                continue
+
+            # Yield frame in multipart format
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpg + b"\r\n")
+
+    def get_bytes(self) -> Optional[np.ndarray]:
+        """
+        Get the next frame, waiting up to one second.
 
         Returns:
             Frame as numpy array or None if timeout
         """
-        try:
-            return self.frame_queue.get(timeout=1.0)
-        except queue.Empty:
-            return None
+        return self.get_frame(timeout=1.0)
 
     def get_frame(self, timeout: float = 1.0) -> Optional[np.ndarray]:
         """
-        Get the next frame from the queue.
+        Wait for a frame newer than the last one returned.
 
         Args:
             timeout: Maximum time to wait for a frame
 
         Returns:
-            Frame as numpy array or None if timeout
+            Read-only frame as numpy array or None if timeout
         """
-        try:
-            return self.frame_queue.get(timeout=timeout)
-        except queue.Empty:
+        seen = getattr(self._consumer, "seen", 0)
+        jpg, _ = self._wait_for_jpeg(seen, timeout)
+        if jpg is None:
             return None
+        frame = self._decode_latest()
+        # The frame decoded may be newer than the one waited for
+        self._consumer.seen = self._decoded_seq
+        return frame
+
+    def _wait_for_jpeg(self, seen: int, timeout: float) -> tuple:
+        """
+        Wait for a JPEG published after sequence number seen.
+
+        Args:
+            seen: Sequence number of the last frame the consumer took
+            timeout: Maximum time to wait
+
+        Returns:
+            (jpeg, sequence number), jpeg is None if nothing new arrived in time
+        """
+        with self._frame_cond:
+            if not self._frame_cond.wait_for(lambda: self._published_seq != seen, timeout):
+                return None, seen
+            return self.latest_jpeg, self._published_seq
 
     def get_latest_frame(self) -> Optional[np.ndarray]:
         """
         Get the most recent frame without blocking.
 
+        The frame is a read-only view shared with other consumers. Call
+        get_latest_frame_copy() if the frame needs to be modified or kept.
+
         Returns:
             Latest frame as numpy array or None if no frame available
         """
         if not self.running:
             return None
-        with self.frame_lock:
-            return self.latest_frame.copy() if self.latest_frame is not None else None
+        return self._decode_latest()
 
-    def _read_mjpeg_stream(self):
-        """Read MJPEG stream from gphoto2 in background thread."""
-        bytes_data = b""
+    def get_latest_frame_copy(self) -> Optional[np.ndarray]:
+        """
+        Get a private, writable copy of the most recent frame.
 
-        while self.running:
-            try:
-                chunk = self.process.stdout.read(4096)
-                if not chunk:
-                    break
+        Returns:
+            Copy of the latest frame or None if no frame available
+        """
+        frame = self.get_latest_frame()
+        return frame.copy() if frame is not None else None
+
+    def _acquire_buffer(self, shape: tuple) -> np.ndarray:
+        """
+        Get a frame buffer that no consumer is still holding.
+
+        Frames handed out are views of pooled buffers, so a buffer is free
+        once only the pool references it. When every buffer is in use a new
+        array is allocated and, while the pool has room, kept for reuse.
 
-                bytes_data += chunk
+        Args:
+            shape: Required (height, width, channels) of the buffer
 
-                # Find JPEG boundaries
-                a = bytes_data.find(b"\xff\xd8")  # JPEG start marker
-                b = bytes_data.find(b"\xff\xd9")  # JPEG end marker
+        Returns:
+            Writable uint8 array of the requested shape
+        """
+        with self._pool_lock:
+            if shape != self._frame_shape:
+                self._frame_shape = shape
+                self._frame_pool = []
+
+            for buf in self._frame_pool:
+                # References: the pool list, the loop variable and getrefcount's argument
+                if sys.getrefcount(buf) <= 3:
+                    return buf
+
+            buf = np.empty(shape, dtype=np.uint8)
+            if len(self._frame_pool) < FRAME_POOL_SIZE:
+                self._frame_pool.append(buf)
+            return buf
+
+    def _decode(self, jpg: bytes) -> Optional[np.ndarray]:
+        """
+        Decode a JPEG frame to BGR.
 
-                if a != -1 and b != -1 and b > a:
-                    jpg = bytes_data[a : b + 2]
-                    bytes_data = bytes_data[b + 2 :]
+        With turbojpeg the frame is decoded into a pooled buffer rather
+        than a freshly allocated array.
 
-                    # Validate JPEG has minimum size
-                    if len(jpg) < 100:
-                        continue
+        Args:
+            jpg: Encoded JPEG bytes
 
-                    # Decode JPEG frame
-                    frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        Returns:
+            Decoded frame or None if the JPEG is invalid
+        """
+        if self._tj is None:
+            return cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
 
-                    if frame is not None:
-                        # Store latest frame
-                        with self.frame_lock:
-                            self.latest_frame = frame
+        try:
+            width, height = self._tj.decode_header(jpg)[:2]
+            dst = self._acquire_buffer((height, width, 3))
+            return self._tj.decode(jpg, pixel_format=TJPF_BGR, dst=dst)
+        except OSError:
+            return None
 
-                        # Add to queue (drop old frames if queue is full)
-                        if self.frame_queue.full():
-                            try:
-                                self.frame_queue.get_nowait()
-                            except queue.Empty:
-                                pass
-                        self.frame_queue.put(frame)
+    def _publish(self, jpg: bytes):
+        """
+        Publish a JPEG as the latest frame, replacing any the consumer has not taken.
+
+        Args:
+            jpg: Encoded JPEG bytes
+        """
+        with self._frame_cond:
+            self.latest_jpeg = jpg
+            self._published_seq += 1
+            self._frame_cond.notify_all()
+
+    def _decode_latest(self) -> Optional[np.ndarray]:
+        """
+        Decode the latest JPEG, once however many consumers ask for it.
+
+        Returns:
+            Read-only frame as numpy array or None if no frame decoded yet
+        """
+        with self._decode_lock:
+            with self._frame_cond:
+                jpg, seq = self.latest_jpeg, self._published_seq
+            if seq == self._decoded_seq or jpg is None:
+                return self.latest_frame
+
+            try:
+                frame = self._decode(jpg)
+            except Exception as e:
+                print(f"Frame decode error: {e}")
+                frame = None
+            self._decoded_seq = seq
+
+            # Keep the previous frame if this JPEG is invalid
+            if frame is not None:
+                # Share one read-only view with every consumer instead of copying
+                frame = frame.view()
+                frame.setflags(write=False)
+                self.latest_frame = frame
+            return self.latest_frame
+
+    def _read_mjpeg_stream(self):
+        """Read MJPEG stream from gphoto2 in background thread."""
+        # Circular buffer: bytes in [head, tail) are unconsumed, the rest is free
+        buf = bytearray(STREAM_BUFFER_SIZE)
+        head = tail = 0
+        start = -1  # offset of the current JPEG start marker
+        scan_offset = 0  # bytes before this offset have already been searched
+
+        # Take over what start_stream's peek left buffered, then read the pipe fd directly
+        stdout = self.process.stdout
+        pending = stdout.peek()
+        tail = len(pending)
+        if tail > len(buf):
+            buf.extend(bytes(tail - len(buf)))
+        buf[:tail] = pending
+        stdout.read(tail)
+        fd = stdout.fileno()
+
+        while self.running:
+            try:
+                if tail == len(buf):
+                    if head == 0:
+                        # A single frame filled the buffer, make room for the rest
+                        buf.extend(bytes(len(buf)))
+                    else:
+                        head, tail, start, scan_offset = self._compact(buf, head, tail, start, scan_offset)
+
+                # Read straight into the free space, bypassing the buffered reader's copy
+                with memoryview(buf) as view:
+                    n = os.readv(fd, [view[tail : tail + READ_CHUNK_SIZE]])
+                if not n:
+                    break
+                tail += n
+
+                # A large read may hold several JPEGs, extract all of them
+                while True:
+                    # Find JPEG boundaries without rescanning old bytes
+                    if start == -1:
+                        start = buf.find(b"\xff\xd8", scan_offset, tail)  # JPEG start marker
+                        if start == -1:
+                            # Nothing before the last byte can begin a frame, drop it
+                            head = scan_offset = max(head, tail - 1)
+                            break
+                        head = start
+                        scan_offset = start + 2
+
+                    end = buf.find(b"\xff\xd9", scan_offset, tail)  # JPEG end marker
+                    if end == -1:
+                        scan_offset = max(start + 2, tail - 1)
+                        break
+
+                    end += 2
+                    jpg = None
+
+                    # Skip undersized JPEGs
+                    if end - start >= 100:
+                        # One copy out of the buffer, which is overwritten by later reads
+                        with memoryview(buf) as view:
+                            jpg = view[start:end].tobytes()
+
+                    head = scan_offset = end
+                    start = -1
+
+                    if jpg is not None:
+                        self._publish(jpg)
+
+                # Move the unconsumed tail to the front only once head is past halfway
+                if head > len(buf) // 2:
+                    head, tail, start, scan_offset = self._compact(buf, head, tail, start, scan_offset)
 
             except Exception as e:
                 if self.running:  # Only print if we're supposed to be running
                     print(f"Stream reading error: {e}")
                 break
 
+    @staticmethod
+    def _compact(buf: bytearray, head: int, tail: int, start: int, scan_offset: int) -> tuple:
+        """
+        Move unconsumed bytes to the front of the stream buffer.
+
+        Args:
+            buf: Stream buffer
+            head: Offset of the first unconsumed byte
+            tail: Offset one past the last byte read
+            start: Offset of the current JPEG start marker, or -1
+            scan_offset: Offset searching resumes from
+
+        Returns:
+            Tuple of (head, tail, start, scan_offset) after the move
+        """
+        size = tail - head
+        buf[:size] = buf[head:tail]
+        if start != -1:
+            start -= head
+        return 0, size, start, scan_offset - head
+
     def __enter__(self):
         """Context manager entry."""
         self.start()
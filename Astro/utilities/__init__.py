@@ -1,21 +1,30 @@
 """Utility modules for astrophotography processing."""
 
-from .filemanager import FileManager
-from .exposure import Exposure
+import importlib
 
+# Public names and the submodule defining each, imported on first access
+_EXPORTS = {
+    "calculate_fwhm": ".analysis",
+    "calculate_fwhm_1d": ".analysis",
+    "draw_star_overlay": ".analysis",
+    "draw_star_overlay_inplace": ".analysis",
+    "get_star_region": ".analysis",
+    "encode_jpeg": ".jpeg",
+    "FWHMTracker": ".analysis",
+    "FileManager": ".filemanager",
+    "Exposure": ".exposure",
+}
 
-from .analysis import (
-    calculate_fwhm,
-    draw_star_overlay,
-    get_star_region,
-    FWHMTracker,
-)
+__all__ = list(_EXPORTS)
 
-__all__ = [
-    "calculate_fwhm",
-    "draw_star_overlay",
-    "get_star_region",
-    "FWHMTracker",
-    "FileManager",
-    "Exposure"
-]
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,9 +1,70 @@
 import cv2
+import math
 import numpy as np
 from scipy.optimize import curve_fit
-from scipy.ndimage import center_of_mass
+from collections import deque
 from typing import Optional, Tuple
 
+try:
+    from numba import njit
+
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# RMS residual over the star, as a fraction of amplitude, above which an axis-aligned fit
+# is rejected. Pixels where the model is below this fraction of the peak are left out.
+SEPARABLE_MAX_RESIDUAL = 0.05
+SEPARABLE_STAR_LEVEL = 0.1
+# Residuals within this multiple of the sky noise are noise, not a tilted star
+SEPARABLE_NOISE_FACTOR = 1.5
+# Relative ftol/xtol for the Gaussian fits, far below the precision FWHM is reported to
+FIT_TOLERANCE = 1e-5
+# Lines either side of the centre averaged into each 1D profile, evens out noise on faint stars
+LINE_BAND = 2
+# Fitted amplitude over residual RMS below which a 1D profile holds no star
+LINE_MIN_SNR = 5
+
+# Fitting coordinate grids keyed by region shape, shared between calls
+_coord_cache = {}
+
+
+def _coords(h: int, w: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get read-only (x, y) coordinate grids for an h x w region.
+
+    Args:
+        h: Region height
+        w: Region width
+
+    Returns:
+        Tuple of (x, y) float grids as produced by np.mgrid
+    """
+    coords = _coord_cache.get((h, w))
+    if coords is None:
+        y_coords, x_coords = np.mgrid[0:h, 0:w].astype(float)
+        x_coords.setflags(write=False)
+        y_coords.setflags(write=False)
+        coords = _coord_cache[(h, w)] = (x_coords, y_coords)
+    return coords
+
+
+def _background(region: np.ndarray) -> float:
+    """
+    Estimate the sky level of a region as its 10th percentile pixel.
+
+    Only seeds the fit, so the nearest ranked pixel from a partial sort stands
+    in for np.percentile's interpolation and its per-call overhead.
+
+    Args:
+        region: Star region
+
+    Returns:
+        Background level
+    """
+    k = region.size // 10
+    return float(np.partition(region.ravel(), k)[k])
+
 
 def gaussian_2d(coords, amplitude, xo, yo, sigma_x, sigma_y, theta, offset):
     """
@@ -23,17 +84,274 @@ def gaussian_2d(coords, amplitude, xo, yo, sigma_x, sigma_y, theta, offset):
         Flattened array of Gaussian values
     """
     x, y = coords
-    xo = float(xo)
-    yo = float(yo)
-    a = (np.cos(theta) ** 2) / (2 * sigma_x**2) + (np.sin(theta) ** 2) / (2 * sigma_y**2)
-    b = -(np.sin(2 * theta)) / (4 * sigma_x**2) + (np.sin(2 * theta)) / (4 * sigma_y**2)
-    c = (np.sin(theta) ** 2) / (2 * sigma_x**2) + (np.cos(theta) ** 2) / (2 * sigma_y**2)
-    g = offset + amplitude * np.exp(
-        -(a * ((x - xo) ** 2) + 2 * b * (x - xo) * (y - yo) + c * ((y - yo) ** 2))
-    )
+    dx = x - float(xo)
+    dy = y - float(yo)
+    cos2 = np.cos(theta) ** 2
+    sin2 = np.sin(theta) ** 2
+    sin_2t = np.sin(2 * theta)
+    a = cos2 / (2 * sigma_x**2) + sin2 / (2 * sigma_y**2)
+    b = -sin_2t / (4 * sigma_x**2) + sin_2t / (4 * sigma_y**2)
+    c = sin2 / (2 * sigma_x**2) + cos2 / (2 * sigma_y**2)
+    g = offset + amplitude * np.exp(-(a * dx * dx + 2 * b * dx * dy + c * dy * dy))
     return g.ravel()
 
 
+def gaussian_2d_jac(coords, amplitude, xo, yo, sigma_x, sigma_y, theta, offset):
+    """
+    Analytic Jacobian of gaussian_2d.
+
+    Args:
+        coords: Tuple of (x, y) coordinate arrays
+        amplitude: Peak amplitude of the Gaussian
+        xo: X-coordinate of the center
+        yo: Y-coordinate of the center
+        sigma_x: Standard deviation in x direction
+        sigma_y: Standard deviation in y direction
+        theta: Rotation angle
+        offset: Background offset
+
+    Returns:
+        (pixels, 7) array of partial derivatives, one column per parameter
+    """
+    x, y = coords
+    dx = (x - float(xo)).ravel()
+    dy = (y - float(yo)).ravel()
+    cos2 = np.cos(theta) ** 2
+    sin2 = np.sin(theta) ** 2
+    sin_2t = np.sin(2 * theta)
+    cos_2t = np.cos(2 * theta)
+    sx2 = sigma_x**2
+    sy2 = sigma_y**2
+    sx3 = sx2 * sigma_x
+    sy3 = sy2 * sigma_y
+    a = cos2 / (2 * sx2) + sin2 / (2 * sy2)
+    b = -sin_2t / (4 * sx2) + sin_2t / (4 * sy2)
+    c = sin2 / (2 * sx2) + cos2 / (2 * sy2)
+    dx2 = dx * dx
+    dxdy = dx * dy
+    dy2 = dy * dy
+    e = np.exp(-(a * dx2 + 2 * b * dxdy + c * dy2))
+    ae = amplitude * e
+
+    # Each parameter moves the exponent through a, b and c
+    jac = np.empty((dx.size, 7))
+    jac[:, 0] = e
+    jac[:, 1] = ae * (2 * a * dx + 2 * b * dy)
+    jac[:, 2] = ae * (2 * b * dx + 2 * c * dy)
+    jac[:, 3] = ae * (cos2 * dx2 - sin_2t * dxdy + sin2 * dy2) / sx3
+    jac[:, 4] = ae * (sin2 * dx2 + sin_2t * dxdy + cos2 * dy2) / sy3
+    k = 1 / (2 * sx2) - 1 / (2 * sy2)
+    jac[:, 5] = -ae * (-sin_2t * k * dx2 - 2 * cos_2t * k * dxdy + sin_2t * k * dy2)
+    jac[:, 6] = 1.0
+    return jac
+
+
+def gaussian_2d_separable(coords, amplitude, xo, yo, sigma_x, sigma_y, offset):
+    """
+    Axis-aligned 2D Gaussian, evaluated as the outer product of two 1D Gaussians.
+
+    Needs one exp per row and column rather than one per pixel.
+
+    Args:
+        coords: Tuple of (x, y) coordinate grids as produced by np.mgrid
+        amplitude: Peak amplitude of the Gaussian
+        xo: X-coordinate of the center
+        yo: Y-coordinate of the center
+        sigma_x: Standard deviation in x direction
+        sigma_y: Standard deviation in y direction
+        offset: Background offset
+
+    Returns:
+        Flattened array of Gaussian values
+    """
+    x, y = coords
+    dx = x[0, :] - float(xo)
+    dy = y[:, 0] - float(yo)
+    gx = np.exp(-(dx * dx) / (2 * sigma_x**2))
+    gy = np.exp(-(dy * dy) / (2 * sigma_y**2))
+    g = offset + amplitude * np.outer(gy, gx)
+    return g.ravel()
+
+
+def gaussian_2d_separable_jac(coords, amplitude, xo, yo, sigma_x, sigma_y, offset):
+    """
+    Analytic Jacobian of gaussian_2d_separable.
+
+    Saves curve_fit a model evaluation per parameter on every iteration.
+
+    Args:
+        coords: Tuple of (x, y) coordinate grids as produced by np.mgrid
+        amplitude: Peak amplitude of the Gaussian
+        xo: X-coordinate of the center
+        yo: Y-coordinate of the center
+        sigma_x: Standard deviation in x direction
+        sigma_y: Standard deviation in y direction
+        offset: Background offset
+
+    Returns:
+        (pixels, 6) array of partial derivatives, one column per parameter
+    """
+    x, y = coords
+    dx = x[0, :] - float(xo)
+    dy = y[:, 0] - float(yo)
+    gx = np.exp(-(dx * dx) / (2 * sigma_x**2))
+    gy = np.exp(-(dy * dy) / (2 * sigma_y**2))
+    gx_dx = gx * dx / sigma_x**2
+    gy_dy = gy * dy / sigma_y**2
+
+    jac = np.empty((dy.size, dx.size, 6))
+    jac[..., 0] = np.outer(gy, gx)
+    jac[..., 1] = amplitude * np.outer(gy, gx_dx)
+    jac[..., 2] = amplitude * np.outer(gy_dy, gx)
+    jac[..., 3] = amplitude * np.outer(gy, gx_dx * dx / sigma_x)
+    jac[..., 4] = amplitude * np.outer(gy_dy * dy / sigma_y, gx)
+    jac[..., 5] = 1.0
+    return jac.reshape(-1, 6)
+
+
+def gaussian_1d(x, amplitude, mu, sigma, offset):
+    """
+    1D Gaussian function for fitting a line through a star.
+
+    Args:
+        x: Pixel coordinates along the line
+        amplitude: Peak amplitude of the Gaussian
+        mu: Center of the Gaussian
+        sigma: Standard deviation
+        offset: Background offset
+
+    Returns:
+        Array of Gaussian values
+    """
+    d = x - mu
+    return offset + amplitude * np.exp(-(d * d) / (2 * sigma**2))
+
+
+def gaussian_1d_jac(x, amplitude, mu, sigma, offset):
+    """
+    Analytic Jacobian of gaussian_1d.
+
+    Args:
+        x: Pixel coordinates along the line
+        amplitude: Peak amplitude of the Gaussian
+        mu: Center of the Gaussian
+        sigma: Standard deviation
+        offset: Background offset
+
+    Returns:
+        (pixels, 4) array of partial derivatives, one column per parameter
+    """
+    d = x - mu
+    g = np.exp(-(d * d) / (2 * sigma**2))
+    jac = np.empty((x.size, 4))
+    jac[:, 0] = g
+    jac[:, 1] = amplitude * g * d / sigma**2
+    jac[:, 2] = jac[:, 1] * d / sigma
+    jac[:, 3] = 1.0
+    return jac
+
+
+if HAS_NUMBA:
+
+    @njit(cache=True, fastmath=True)
+    def _gaussian_2d_fused(out, amplitude, xo, yo, sigma_x, sigma_y, theta, offset):
+        """
+        Rotated 2D Gaussian evaluated in a single pass into a preallocated array.
+
+        Pixel (i, j) is taken to sit at x = j, y = i, matching the np.mgrid
+        grids used by calculate_fwhm.
+
+        Args:
+            out: (h, w) float array the Gaussian is written into
+            amplitude: Peak amplitude of the Gaussian
+            xo: X-coordinate of the center
+            yo: Y-coordinate of the center
+            sigma_x: Standard deviation in x direction
+            sigma_y: Standard deviation in y direction
+            theta: Rotation angle
+            offset: Background offset
+        """
+        cos2 = np.cos(theta) ** 2
+        sin2 = np.sin(theta) ** 2
+        sin_2t = np.sin(2 * theta)
+        a = cos2 / (2 * sigma_x**2) + sin2 / (2 * sigma_y**2)
+        b = -sin_2t / (4 * sigma_x**2) + sin_2t / (4 * sigma_y**2)
+        c = sin2 / (2 * sigma_x**2) + cos2 / (2 * sigma_y**2)
+        h, w = out.shape
+        for i in range(h):
+            dy = i - yo
+            for j in range(w):
+                dx = j - xo
+                exponent = a * dx * dx + 2 * b * dx * dy + c * dy * dy
+                out[i, j] = offset + amplitude * np.exp(-exponent)
+
+    @njit(cache=True, fastmath=True)
+    def _gaussian_1d_fused(x, amplitude, mu, sigma, offset):
+        """gaussian_1d in a single loop, no NumPy temporaries per call."""
+        out = np.empty(x.size)
+        k = 1.0 / (2 * sigma * sigma)
+        for i in range(x.size):
+            d = x[i] - mu
+            out[i] = offset + amplitude * np.exp(-d * d * k)
+        return out
+
+    @njit(cache=True, fastmath=True)
+    def _gaussian_1d_jac_fused(x, amplitude, mu, sigma, offset):
+        """gaussian_1d_jac in a single loop, no NumPy temporaries per call."""
+        jac = np.empty((x.size, 4))
+        k = 1.0 / (2 * sigma * sigma)
+        for i in range(x.size):
+            d = x[i] - mu
+            g = np.exp(-d * d * k)
+            jac[i, 0] = g
+            jac[i, 1] = amplitude * g * d / (sigma * sigma)
+            jac[i, 2] = jac[i, 1] * d / sigma
+            jac[i, 3] = 1.0
+        return jac
+
+    # The 1D fits call the model and Jacobian on ~40 pixels, where NumPy's per-ufunc
+    # dispatch costs more than the arithmetic
+    _line_model = _gaussian_1d_fused
+    _line_jac = _gaussian_1d_jac_fused
+else:
+    _line_model = gaussian_1d
+    _line_jac = gaussian_1d_jac
+
+
+def warm_up():
+    """Load or compile the numba kernels now rather than on the first measured frame."""
+    if HAS_NUMBA:
+        x = np.arange(8.0)
+        _line_model(x, 1.0, 4.0, 2.0, 0.0)
+        _line_jac(x, 1.0, 4.0, 2.0, 0.0)
+        _gaussian_2d_fused(np.empty((8, 8)), 1.0, 4.0, 4.0, 2.0, 2.0, 0.0, 0.0)
+
+
+def _separable_fits(data: np.ndarray, model: np.ndarray, popt) -> bool:
+    """
+    Check an axis-aligned fit is good enough to skip the rotated one.
+
+    The residual is taken over the star's pixels only, the background that fills
+    most of the box would otherwise dilute the misfit of a tilted, elongated star.
+
+    Args:
+        data: Region pixels, flattened
+        model: Separable model evaluated on the same pixels
+        popt: Fitted separable parameters
+
+    Returns:
+        True if the fit describes the star
+    """
+    amplitude, offset = abs(popt[0]), popt[5]
+    star = np.abs(model - offset) > SEPARABLE_STAR_LEVEL * amplitude
+    if not star.any() or star.all():
+        return False
+    residual = data - model
+    misfit = np.sqrt(np.mean(residual[star] ** 2))
+    noise = np.sqrt(np.mean(residual[~star] ** 2))
+    return misfit <= max(SEPARABLE_MAX_RESIDUAL * amplitude, SEPARABLE_NOISE_FACTOR * noise)
+
+
 def calculate_fwhm(frame: np.ndarray, x: int, y: int, box_size: int = 40) -> Optional[float]:
     """
     Calculate FWHM of a star at position (x, y) using 2D Gaussian fitting.
@@ -48,10 +366,6 @@ def calculate_fwhm(frame: np.ndarray, x: int, y: int, box_size: int = 40) -> Opt
         Average FWHM value in pixels, or None if calculation fails
     """
     try:
-        # Convert to grayscale if needed
-        if len(frame.shape) == 3:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
         # Extract region around star
         half_box = box_size // 2
         x_min = max(0, x - half_box)
@@ -59,41 +373,90 @@ def calculate_fwhm(frame: np.ndarray, x: int, y: int, box_size: int = 40) -> Opt
         y_min = max(0, y - half_box)
         y_max = min(frame.shape[0], y + half_box)
 
-        region = frame[y_min:y_max, x_min:x_max].astype(float)
+        region = frame[y_min:y_max, x_min:x_max]
 
         if region.size == 0:
             return None
 
-        # Create coordinate arrays
+        # Convert only the box to grayscale, not the whole frame. OpenCV reads the
+        # strided ROI view directly, and the float conversion is the only full copy.
+        if len(region.shape) == 3:
+            region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        region = region.astype(float, copy=False)
+
+        # Coordinate arrays, reused for every region of the same size
         h, w = region.shape
-        y_coords, x_coords = np.mgrid[0:h, 0:w]
+        coords = _coords(h, w)
 
         # Initial guess for Gaussian parameters
-        background = np.percentile(region, 10)
+        background = _background(region)
         amplitude = region.max() - background
 
-        # Find approximate center using center of mass
+        # Find approximate center using center of mass of the row and column sums
         threshold_region = region - background
-        threshold_region[threshold_region < 0] = 0
-        cy, cx = center_of_mass(threshold_region)
+        np.maximum(threshold_region, 0, out=threshold_region)
+        col_sum = threshold_region.sum(axis=0)
+        row_sum = threshold_region.sum(axis=1)
+        total = col_sum.sum()
 
-        if np.isnan(cx) or np.isnan(cy):
+        if total <= 0:
             return None
 
+        x_grid, y_grid = coords
+        cx = (col_sum @ x_grid[0, :]) / total
+        cy = (row_sum @ y_grid[:, 0]) / total
+
         initial_guess = (
             amplitude,  # amplitude
             cx,  # x center
             cy,  # y center
             3.0,  # sigma_x
             3.0,  # sigma_y
-            0.0,  # theta (rotation)
             background,  # offset
         )
-
-        # Fit 2D Gaussian
-        popt, _ = curve_fit(
-            gaussian_2d, (x_coords, y_coords), region.ravel(), p0=initial_guess, maxfev=1000
-        )
+        data = region.ravel()
+
+        # Fit an axis-aligned Gaussian first, it is much cheaper to evaluate
+        popt = None
+        try:
+            popt, _ = curve_fit(
+                gaussian_2d_separable,
+                coords,
+                data,
+                p0=initial_guess,
+                jac=gaussian_2d_separable_jac,
+                check_finite=False,
+                ftol=FIT_TOLERANCE,
+                xtol=FIT_TOLERANCE,
+                maxfev=1000,
+            )
+            if not _separable_fits(data, gaussian_2d_separable(coords, *popt), popt):
+                popt = None
+        except RuntimeError:
+            pass
+
+        # Fall back to a rotated Gaussian for elongated, tilted stars
+        if popt is None:
+            model = gaussian_2d
+            if HAS_NUMBA:
+                # curve_fit subtracts the data from each result, so reusing out is safe
+                out = np.empty((h, w))
+
+                def model(coords, *params):
+                    _gaussian_2d_fused(out, *params)
+                    return out.ravel()
+
+            popt, _ = curve_fit(
+                model,
+                coords,
+                data,
+                p0=initial_guess[:5] + (0.0,) + initial_guess[5:],
+                jac=gaussian_2d_jac,
+                check_finite=False,
+                ftol=FIT_TOLERANCE,
+                xtol=FIT_TOLERANCE,
+                maxfev=1000,
+            )
 
         # Extract sigma values and calculate FWHM
         sigma_x = abs(popt[3])
@@ -111,6 +474,124 @@ def calculate_fwhm(frame: np.ndarray, x: int, y: int, box_size: int = 40) -> Opt
         return None
 
 
+def _fit_line(profile: np.ndarray, centre: float, sigma: float, background: float):
+    """
+    Fit a 1D Gaussian to a line profile through a star.
+
+    Args:
+        profile: Pixel values along the line
+        centre: Initial centre estimate
+        sigma: Initial sigma estimate
+        background: Initial offset estimate
+
+    Returns:
+        (mu, sigma) of the fit, or None if it found no star inside the profile
+    """
+    p0 = (profile.max() - background, centre, sigma, background)
+    x = np.arange(profile.size, dtype=float)
+    popt, _ = curve_fit(
+        _line_model,
+        x,
+        profile,
+        p0=p0,
+        jac=_line_jac,
+        check_finite=False,
+        ftol=FIT_TOLERANCE,
+        xtol=FIT_TOLERANCE,
+        maxfev=200,
+    )
+    amplitude, mu, sigma, _ = popt
+    sigma = abs(sigma)
+    # A fit left at its starting point, or one outside the profile, is not a star
+    if (popt == p0).all() or amplitude <= 0 or not 0 <= mu < profile.size:
+        return None
+    if not 0 < sigma < profile.size / 2:
+        return None
+    # Nor is a peak that barely stands out of the residual noise
+    residual = profile - _line_model(x, *popt)
+    noise = np.sqrt(np.mean(residual**2))
+    if amplitude < LINE_MIN_SNR * noise:
+        return None
+    return mu, sigma
+
+
+def calculate_fwhm_1d(frame: np.ndarray, x: int, y: int, box_size: int = 40) -> Optional[float]:
+    """
+    Calculate FWHM of a star at position (x, y) from 1D Gaussian fits.
+
+    Fits a band of rows through the star's centroid, a band of columns through
+    the fitted x centre, then the rows again through the fitted y centre. Far
+    cheaper than calculate_fwhm's 2D fit, so suited to per-frame measurement,
+    but reads elongated stars at an angle slightly narrow.
+
+    Args:
+        frame: Input image (grayscale or color)
+        x: X-coordinate of the star center
+        y: Y-coordinate of the star center
+        box_size: Size of the box around the star for fitting
+
+    Returns:
+        Average FWHM value in pixels, or None if calculation fails
+    """
+    try:
+        # Extract region around star
+        half_box = box_size // 2
+        x_min = max(0, x - half_box)
+        x_max = min(frame.shape[1], x + half_box)
+        y_min = max(0, y - half_box)
+        y_max = min(frame.shape[0], y + half_box)
+
+        region = frame[y_min:y_max, x_min:x_max]
+
+        if region.size == 0:
+            return None
+
+        if len(region.shape) == 3:
+            region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        region = region.astype(float, copy=False)
+
+        # Initial centre from the centre of mass above background, as calculate_fwhm
+        background = _background(region)
+        threshold_region = region - background
+        np.maximum(threshold_region, 0, out=threshold_region)
+        col_sum = threshold_region.sum(axis=0)
+        row_sum = threshold_region.sum(axis=1)
+        total = col_sum.sum()
+
+        if total <= 0:
+            return None
+
+        cx = (col_sum @ np.arange(col_sum.size)) / total
+        cy = (row_sum @ np.arange(row_sum.size)) / total
+
+        def rows(centre):
+            c = int(round(centre))
+            return region[max(c - LINE_BAND, 0) : c + LINE_BAND + 1].mean(axis=0)
+
+        def columns(centre):
+            c = int(round(centre))
+            return region[:, max(c - LINE_BAND, 0) : c + LINE_BAND + 1].mean(axis=1)
+
+        fit_x = _fit_line(rows(cy), cx, 3.0, background)
+        if fit_x is None:
+            return None
+        fit_y = _fit_line(columns(fit_x[0]), cy, 3.0, background)
+        if fit_y is None:
+            return None
+        # Refit the rows through the fitted centre when the centroid row missed it
+        if int(round(fit_y[0])) != int(round(cy)):
+            fit_x = _fit_line(rows(fit_y[0]), fit_x[0], fit_x[1], background)
+            if fit_x is None:
+                return None
+
+        # FWHM = 2.355 * sigma (for Gaussian)
+        return 2.355 * (fit_x[1] + fit_y[1]) / 2.0
+
+    except Exception:
+        # Silently return None on error - caller can decide how to handle
+        return None
+
+
 def draw_star_overlay(
     frame: np.ndarray,
     x: int,
@@ -118,6 +599,7 @@ def draw_star_overlay(
     fwhm: Optional[float] = None,
     box_size: int = 40,
     color: Tuple[int, int, int] = (0, 0, 255),
+    out: Optional[np.ndarray] = None,
 ) -> np.ndarray:
     """
     Draw overlay markers on a frame showing the selected star and FWHM measurement.
@@ -129,28 +611,58 @@ def draw_star_overlay(
         fwhm: FWHM value to display (optional)
         box_size: Size of the measurement box
         color: BGR color for the overlay
+        out: Buffer of the same shape as frame to draw into, reused between calls
+            instead of allocating a copy (optional)
 
     Returns:
         Frame with overlay drawn
     """
-    display_frame = frame.copy()
+    if out is None:
+        display_frame = frame.copy()
+    else:
+        np.copyto(out, frame)
+        display_frame = out
+
+    return draw_star_overlay_inplace(display_frame, x, y, fwhm, box_size, color)
+
+
+def draw_star_overlay_inplace(
+    frame: np.ndarray,
+    x: int,
+    y: int,
+    fwhm: Optional[float] = None,
+    box_size: int = 40,
+    color: Tuple[int, int, int] = (0, 0, 255),
+) -> np.ndarray:
+    """
+    Draw overlay markers directly onto a frame the caller no longer needs.
+
+    Args:
+        frame: Writable input image, modified in place
+        x: X-coordinate of the star center
+        y: Y-coordinate of the star center
+        fwhm: FWHM value to display (optional)
+        box_size: Size of the measurement box
+        color: BGR color for the overlay
+
+    Returns:
+        The same frame with overlay drawn
+    """
     half_box = box_size // 2
 
     # Draw box around star
-    cv2.rectangle(
-        display_frame, (x - half_box, y - half_box), (x + half_box, y + half_box), color, 2
-    )
+    cv2.rectangle(frame, (x - half_box, y - half_box), (x + half_box, y + half_box), color, 2)
 
     # Draw crosshair
-    cv2.line(display_frame, (x - 10, y), (x + 10, y), color, 1)
-    cv2.line(display_frame, (x, y - 10), (x, y + 10), color, 1)
+    cv2.line(frame, (x - 10, y), (x + 10, y), color, 1)
+    cv2.line(frame, (x, y - 10), (x, y + 10), color, 1)
 
     # Draw FWHM value if provided
     if fwhm is not None:
         text = f"FWHM: {fwhm:.2f} px"
-        cv2.putText(display_frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 2)
+        cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 2)
 
-    return display_frame
+    return frame
 
 
 def get_star_region(
@@ -203,18 +715,26 @@ class FWHMTracker:
             max_history: Maximum number of measurements to keep in history
         """
         self.max_history = max_history
-        self.history = []
+        self.history = deque(maxlen=max_history)
+        # Running sums so mean and std don't walk the history
+        self._sum = 0.0
+        self._sumsq = 0.0
 
     def add_measurement(self, fwhm: float):
         """Add a new FWHM measurement to the history."""
         if fwhm is not None:
+            if len(self.history) == self.max_history:
+                # The deque evicts the oldest value on append
+                oldest = self.history[0]
+                self._sum -= oldest
+                self._sumsq -= oldest * oldest
             self.history.append(fwhm)
-            if len(self.history) > self.max_history:
-                self.history.pop(0)
+            self._sum += fwhm
+            self._sumsq += fwhm * fwhm
 
     def get_history(self) -> list:
         """Get the full measurement history."""
-        return self.history.copy()
+        return list(self.history)
 
     def get_current(self) -> Optional[float]:
         """Get the most recent measurement."""
@@ -230,11 +750,14 @@ class FWHMTracker:
 
     def get_mean(self) -> Optional[float]:
         """Get the mean FWHM value."""
-        return np.mean(self.history) if self.history else None
+        return self._sum / len(self.history) if self.history else None
 
     def get_std(self) -> Optional[float]:
         """Get the standard deviation of FWHM values."""
-        return np.std(self.history) if self.history else None
+        if not self.history:
+            return None
+        mean = self._sum / len(self.history)
+        return math.sqrt(max(0.0, self._sumsq / len(self.history) - mean * mean))
 
     def get_count(self) -> int:
         """Get the number of measurements."""
@@ -242,7 +765,9 @@ class FWHMTracker:
 
     def reset(self):
         """Clear all measurements."""
-        self.history = []
+        self.history.clear()
+        self._sum = 0.0
+        self._sumsq = 0.0
 
     def get_statistics(self) -> dict:
         """
@@ -251,11 +776,24 @@ class FWHMTracker:
         Returns:
             Dictionary with current, best, worst, mean, std, and count
         """
+        count = len(self.history)
+        if count == 0:
+            return {
+                "current": None,
+                "best": None,
+                "worst": None,
+                "mean": None,
+                "std": None,
+                "count": 0,
+            }
+
+        # Mean and std come straight from the running sums, only min/max walk the history
+        mean = self._sum / count
         return {
-            "current": self.get_current(),
-            "best": self.get_best(),
-            "worst": self.get_worst(),
-            "mean": self.get_mean(),
-            "std": self.get_std(),
-            "count": self.get_count(),
+            "current": self.history[-1],
+            "best": min(self.history),
+            "worst": max(self.history),
+            "mean": mean,
+            "std": math.sqrt(max(0.0, self._sumsq / count - mean * mean)),
+            "count": count,
         }
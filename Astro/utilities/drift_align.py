@@ -1,4 +1,4 @@
-from astropy.coordinates import AltAz, EarthLocation
+from astropy.coordinates import EarthLocation
 import astropy.units as u
 from .exposure import Exposure
 
@@ -7,7 +7,8 @@ class DriftAlign:
     def __init__(self, lat, lon):
         self.lat = lat * u.deg
         self.lon = lon * u.deg
-        pass
+        # Observer location never changes, build it once
+        self.location = EarthLocation(lat=self.lat, lon=self.lon)
 
     def get_error(self, image1: Exposure, image2: Exposure):
         # Good drift alignment: ≤ 30 arcsec/min.
@@ -17,44 +18,23 @@ class DriftAlign:
         # 1. Observer location
         # -----------------------------
 
-        location = EarthLocation(lat=self.lat, lon=self.lon)
+        location = self.location
 
         # -----------------------------
-        # 2. Load exposure coordinates
-        # -----------------------------
-
-        # RA/Dec of image centers
-        radec1 = image1.radec()  # RA/Dec of 1st image centre
-        radec2 = image2.radec()  # RA/Dec of 2nd image centre
-
-        # -----------------------------
-        # 3. Convert to Alt/Az
+        # 2. Convert to Alt/Az
         # -----------------------------
         # Get times
         dt = (image2.time - image1.time).to(u.min)
 
-        # Get reference frames for the two times
-        frame1 = AltAz(obstime=image1.time, location=location)
-        frame2 = AltAz(obstime=image2.time, location=location)
-
-        # Convert RA/Dec coordinates to Alt/Az
-        altaz1 = radec1.transform_to(frame1)  # exposure 1 actual Alt/Az
-        altaz2_exp = radec1.transform_to(frame2)  # exposure 2 Alt/Az if perfectly aligned
-        altaz2_act = radec2.transform_to(frame2)  # exposure 2 actual Alt/Az
+        # RA/Dec of the image centres converted to Alt/Az, cached on each exposure
+        altaz2_exp = image1.altaz(location, image2.time)  # exposure 2 Alt/Az if perfectly aligned
+        altaz2_act = image2.altaz(location, image2.time)  # exposure 2 actual Alt/Az
 
         # -----------------------------
-        # 4. Compute drift (observed)
+        # 3. Compute drift (observed)
         # -----------------------------
-        # Ideal change in Alt/Az
-        delta_alt_exp = (altaz2_exp.alt - altaz1.alt).wrap_at(180 * u.deg)
-        delta_az_exp = (altaz2_exp.az - altaz1.az).wrap_at(180 * u.deg)
-
-        # Actual change in Alt/Az
-        delta_alt_act = (altaz2_act.alt - altaz1.alt).wrap_at(180 * u.deg)
-        delta_az_act = (altaz2_act.az - altaz1.az).wrap_at(180 * u.deg)
-
-        # Alt/Az drift
-        drift_alt = (delta_alt_exp - delta_alt_act).to(u.arcsec) / dt
-        drift_az = (delta_az_exp - delta_az_act).to(u.arcsec) / dt
+        # Drift is the ideal minus the actual change from exposure 1, whose Alt/Az cancels
+        drift_alt = (altaz2_exp.alt - altaz2_act.alt).wrap_at(180 * u.deg).to(u.arcsec) / dt
+        drift_az = (altaz2_exp.az - altaz2_act.az).wrap_at(180 * u.deg).to(u.arcsec) / dt
 
         return drift_alt, drift_az
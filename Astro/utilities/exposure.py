@@ -1,22 +1,259 @@
+import atexit
+import hashlib
+import inspect
+import io
 import exiftool
 import json
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import rawpy
 import numpy as np
 import os
 from astropy.io import fits
 from astropy.wcs import WCS
 import subprocess
-from photutils.aperture import CircularAperture
+import tempfile
+import urllib.parse
+import urllib.request
 import matplotlib.pyplot as plt
-from skimage.feature import blob_doh
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import EllipseCollection
+from matplotlib.figure import Figure
+from skimage.feature import blob_doh, blob_dog, peak_local_max
+from skimage.util import img_as_float32, img_as_float64
 from astropy.time import Time
-from datetime import datetime
-from astropy.coordinates import SkyCoord
+from functools import cached_property
+from astropy.coordinates import AltAz, EarthLocation, SkyCoord
 import cv2
+from .jpeg import encode_jpeg
+
+try:
+    import cupy as cp
+    from cucim.skimage.feature import blob_doh as blob_doh_gpu, blob_dog as blob_dog_gpu
+
+    HAS_CUCIM = cp.cuda.runtime.getDeviceCount() > 0
+except Exception:
+    # ImportError, or CUDARuntimeError when there is no usable GPU
+    HAS_CUCIM = False
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# One exiftool process kept open in -stay_open mode for every exposure, saves the
+# Perl start-up on each read. -fast2 skips maker notes, the tags used are in EXIF.
+EXIFTOOL_ARGS = ["-G", "-n", "-fast2"]
+_exiftool = None
+_exiftool_lock = threading.Lock()
+
+
+def _get_exif(path: str) -> dict:
+    """Read the metadata of one file with the shared exiftool process."""
+    return _get_exif_many([path])[0]
+
+
+def _get_exif_many(paths: list) -> list:
+    """Read the metadata of several files in one request to the shared exiftool process."""
+    global _exiftool
+    with _exiftool_lock:
+        if _exiftool is None:
+            _exiftool = exiftool.ExifToolHelper(common_args=EXIFTOOL_ARGS)
+        return _exiftool.get_metadata(paths)
+
+
+_plot_figure = None
+_plot_lock = threading.Lock()
+
+
+def _get_plot_axes():
+    """Shared off-screen Agg figure for centroid plots, created on first use."""
+    global _plot_figure
+    if _plot_figure is None:
+        # Not made through pyplot, so it never touches the interactive backend
+        _plot_figure = Figure(figsize=(12, 8))
+        FigureCanvasAgg(_plot_figure)
+        _plot_figure.add_subplot()
+    return _plot_figure.axes[0]
+
+
+def close_exiftool():
+    """Stop the shared exiftool process, a later read starts a new one."""
+    global _exiftool
+    with _exiftool_lock:
+        if _exiftool is not None:
+            if _exiftool.running:
+                _exiftool.terminate()
+            _exiftool = None
+
+
+atexit.register(close_exiftool)
+
+# Side of the square tiles CPU blob detection is split into, None to detect in one pass.
+# Off by default: the padding adds work that only pays off with several cores free.
+BLOB_TILE = None
+
+# solve-field's intermediate files go here rather than next to the exposure, in memory where
+# /dev/shm exists. Only the .wcs solution is written back to the exposure directory.
+SOLVE_SCRATCH = os.environ.get(
+    "ASTRO_SCRATCH", "/dev/shm/astro" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+# Directory demosaiced images are kept in as .npy files (about 72 MB per frame), so a raw is
+# only decoded once. Off unless set, the oldest files are removed beyond IMAGE_CACHE_MAX_BYTES.
+IMAGE_CACHE = os.environ.get("ASTRO_IMAGE_CACHE")
+IMAGE_CACHE_MAX_BYTES = int(float(os.environ.get("ASTRO_IMAGE_CACHE_GB", "4")) * 1e9)
+
+
+def blob_peaks(image: np.ndarray, min_sigma: float = 1, threshold: float = 5) -> np.ndarray:
+    """
+    Detect stars as local maxima of a box-filtered image.
+
+    Much cheaper than the scale-space detectors when only positions are needed,
+    every blob is reported with sigma equal to min_sigma.
+
+    Args:
+        image: Single channel float image
+        min_sigma: Expected star sigma in pixels, sets the filter size and peak spacing
+        threshold: Peak height above the median in standard deviations of the filtered image
+
+    Returns:
+        Array of (y, x, sigma) rows
+    """
+    size = max(3, int(round(2 * min_sigma)) | 1)
+    smoothed = cv2.blur(image, (size, size))
+    floor = np.median(smoothed) + threshold * smoothed.std()
+    coords = peak_local_max(smoothed, min_distance=size, threshold_abs=floor)
+    return np.column_stack([coords, np.full(len(coords), min_sigma)]).astype(np.float64)
+
+
+def _channel_mean(image: np.ndarray) -> np.ndarray:
+    """
+    Mean of the colour channels in float32, on the same scale as the input.
+
+    Equal to image.mean(axis=2), so the detector thresholds keep their meaning: a float
+    image is not rescaled to [0, 1] by skimage as an integer one would be. Summed in
+    integers and stored as float32, half the size of NumPy's float64 result.
+
+    Args:
+        image: (h, w, 3) integer image
+
+    Returns:
+        (h, w) float32 mean
+    """
+    total = np.add.reduce(image, axis=2, dtype=np.uint16 if image.itemsize == 1 else np.uint32)
+    return np.multiply(total, np.float32(1 / image.shape[2]), dtype=np.float32)
+
+
+def _box_flux(target: np.ndarray, blobs: np.ndarray) -> np.ndarray:
+    """
+    Sum the pixels in a box of half-size sigma around each blob.
+
+    Uses one integral image, so the cost per blob is four lookups.
+
+    Args:
+        target: Single channel image the blobs were detected in
+        blobs: Array of (y, x, sigma) rows
+
+    Returns:
+        Background subtracted box sum of each blob
+    """
+    height, width = target.shape
+    integral = cv2.integral(target).astype(np.float64)
+
+    y = np.rint(blobs[:, 0]).astype(int)
+    x = np.rint(blobs[:, 1]).astype(int)
+    r = np.ceil(blobs[:, 2]).astype(int)
+    y0, y1 = np.clip(y - r, 0, height), np.clip(y + r + 1, 0, height)
+    x0, x1 = np.clip(x - r, 0, width), np.clip(x + r + 1, 0, width)
+
+    total = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    background = integral[-1, -1] / (height * width)
+    return total - background * (y1 - y0) * (x1 - x0)
+
+
+def _blobs_tiled(detect, target: np.ndarray, tile: int, **kwargs) -> np.ndarray:
+    """
+    Run a skimage blob detector over overlapping tiles in parallel.
+
+    Each tile is padded by three times max_sigma so blobs near its edge are
+    found whole, and a blob is kept only by the tile whose unpadded area
+    holds its centre, so none are reported twice.
+
+    Args:
+        detect: skimage blob detector, blob_doh or blob_dog
+        target: Single channel image
+        tile: Side of the unpadded tiles in pixels
+        kwargs: Passed on to the detector
+
+    Returns:
+        Array of (y, x, sigma) rows in target coordinates
+    """
+    max_sigma = kwargs.get("max_sigma", inspect.signature(detect).parameters["max_sigma"].default)
+    overlap = int(np.ceil(3 * max_sigma))
+    height, width = target.shape
+
+    def detect_tile(y0, x0):
+        ya, xa = max(0, y0 - overlap), max(0, x0 - overlap)
+        yb, xb = min(height, y0 + tile + overlap), min(width, x0 + tile + overlap)
+        blobs = detect(target[ya:yb, xa:xb], **kwargs)
+        blobs[:, 0] += ya
+        blobs[:, 1] += xa
+        owned = (
+            (blobs[:, 0] >= y0)
+            & (blobs[:, 0] < y0 + tile)
+            & (blobs[:, 1] >= x0)
+            & (blobs[:, 1] < x0 + tile)
+        )
+        return blobs[owned]
+
+    origins = [(y0, x0) for y0 in range(0, height, tile) for x0 in range(0, width, tile)]
+    with ThreadPoolExecutor() as pool:
+        results = list(pool.map(lambda origin: detect_tile(*origin), origins))
+    return np.concatenate(results)
+
+
+def _save_npy(path: str, image: np.ndarray):
+    """Save an array under a temporary name then rename, a partial file is never loaded."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, image, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+def _decode_to_npy(image_path: str, cache_path: str):
+    """Demosaic a raw file into an .npy image cache. Module level to run in a worker process."""
+    with rawpy.imread(image_path) as raw:
+        _save_npy(cache_path, raw.postprocess())
+
+
+def _trim_image_cache():
+    """Remove the oldest image cache files until the cache fits in IMAGE_CACHE_MAX_BYTES."""
+    entries = []
+    with os.scandir(IMAGE_CACHE) as it:
+        for entry in it:
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= IMAGE_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
 
 
 class Exposure:
-    def __init__(self, path: str) -> None:
+    # (ra, dec, radius) of the last successful plate solve, hints the next one
+    last_solution = None
+
+    def __init__(self, path: str, exif: dict = None) -> None:
         # Convert to absolute path to handle relative paths correctly
         abs_path = os.path.abspath(path)
         self.stub = os.path.basename(abs_path).split(".")[0]
@@ -25,70 +262,217 @@ class Exposure:
         self.path = f"{self.directory}/{self.stub}"
         self.image_path = f"{self.path}.{self.img_ext}"
         self.data = dict()
+        self._exported: bytes = None  # sidecar contents as last read or written
         self.image: np.ndarray = None
         self.star_xy = None
         self.wcs = None
+        # Source centroids kept as separate contiguous columns, ready for the xyls table
+        self.sources_x: np.ndarray = None
+        self.sources_y: np.ndarray = None
         self.fwhm = None
+        self.flux = None
         self.ra = None
         self.dec = None
         self.radius = None
-        self.import_data()
-
-        time = self.data["time_iso"]
-        time = datetime.fromisoformat(time)
-        self.time = Time(time)
+        # Centre coordinates derived from the WCS, cleared when the WCS is reloaded
+        self._radec = None
+        self._altaz = dict()
+        self._preview: bytes = None  # multipart JPEG frame returned by get_bytes
+        # Luminance of self.image, kept with the array it came from
+        self._mono: np.ndarray = None
+        self._mono_src: np.ndarray = None
+        # Last blobs result, reused while the image, settings and sources are unchanged
+        self._blobs: np.ndarray = None
+        self._blobs_key = None
+        self.import_data(exif)
+
+    @property
+    def sources(self):
+        # Nx2 (x, y) array, built from the columns on demand
+        if self.sources_x is None:
+            return None
+        return np.column_stack((self.sources_x, self.sources_y))
 
-    def load_image(self):
+    @sources.setter
+    def sources(self, xy):
+        if xy is None:
+            self.sources_x = self.sources_y = None
+            return
+        xy = np.asarray(xy, dtype=np.float64)
+        self.sources_x = np.ascontiguousarray(xy[:, 0])
+        self.sources_y = np.ascontiguousarray(xy[:, 1])
+
+    @cached_property
+    def time(self) -> Time:
+        # Parsed on first use, astropy reads the stored ISO string directly
+        return Time(self.data["time_iso"], format="isot", scale="utc")
+
+    def load_image(self, preview: bool = False):
+        # Memory-map the demosaiced image saved by an earlier load instead of decoding again.
+        # Copy-on-write, so the image is writable and changes never reach the cache file.
+        if not preview and self._image_cache_valid():
+            self.image = np.load(self._image_cache_path(), mmap_mode="c", allow_pickle=False)
+            return self.image
+
+        # A preview is decoded at half size without demosaicing and isn't kept,
+        # source detection needs the full resolution image
         with rawpy.imread(f"{self.image_path}") as raw:
+            if preview:
+                return raw.postprocess(
+                    use_camera_wb=True,
+                    half_size=True,
+                    no_auto_bright=False,
+                    output_bps=8,
+                )
             self.image = raw.postprocess()
+        self._save_image_cache()
         return self.image
 
+    def get_mono(self) -> np.ndarray:
+        # Channel mean, computed once per loaded image and shared by every detection
+        if self.image.ndim == 2:
+            return self.image
+        if self._mono_src is not self.image:
+            self._mono = _channel_mean(self.image)
+            self._mono_src = self.image
+        return self._mono
+
+    def _image_cache_path(self) -> str:
+        # Named after the raw's full path, exposures in different directories can share a stub
+        if IMAGE_CACHE is None:
+            return None
+        digest = hashlib.sha1(self.path.encode()).hexdigest()[:12]
+        return os.path.join(IMAGE_CACHE, f"{self.stub}-{digest}.npy")
+
+    def _image_cache_valid(self) -> bool:
+        # The demosaiced image cache is usable if written after the raw file
+        cache_path = self._image_cache_path()
+        return cache_path is not None and os.path.exists(cache_path) and (
+            not os.path.exists(self.image_path)
+            or os.path.getmtime(cache_path) >= os.path.getmtime(self.image_path)
+        )
+
+    def _save_image_cache(self):
+        if IMAGE_CACHE is None:
+            return
+        os.makedirs(IMAGE_CACHE, exist_ok=True)
+        _save_npy(self._image_cache_path(), self.image)
+        _trim_image_cache()
+
+    @classmethod
+    def decode_many(cls, paths, max_workers: int = None) -> list:
+        """
+        Create exposures and load their images, demosaicing uncached raws in parallel.
+
+        LibRaw decodes one file per process, so worker processes write .npy files
+        and every image is then loaded from them here. Nothing large is pickled
+        back from the workers. Without IMAGE_CACHE the files are temporary.
+
+        Args:
+            paths: Raw file paths
+            max_workers: Worker processes, defaults to half the CPUs since each
+                holds a full demosaiced frame
+
+        Returns:
+            List of Exposure objects with images loaded
+        """
+        exposures = cls.from_paths(paths)
+        pending = [e for e in exposures if not e._image_cache_valid()]
+        if max_workers is None:
+            max_workers = max(1, (os.cpu_count() or 2) // 2)
+        if pending and IMAGE_CACHE is not None:
+            os.makedirs(IMAGE_CACHE, exist_ok=True)
+
+        with tempfile.TemporaryDirectory() as scratch:
+            outputs = {
+                id(e): e._image_cache_path() or os.path.join(scratch, f"{i}.npy")
+                for i, e in enumerate(pending)
+            }
+            if pending:
+                # rawpy's OpenMP build can deadlock in forked children, so spawn them
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+                    jobs = [
+                        pool.submit(_decode_to_npy, e.image_path, outputs[id(e)]) for e in pending
+                    ]
+                    for job in jobs:
+                        job.result()
+
+            for e in exposures:
+                if IMAGE_CACHE is None and id(e) in outputs:
+                    # Read into memory before the scratch directory is removed
+                    e.image = np.load(outputs[id(e)], allow_pickle=False)
+                else:
+                    e.load_image()
+        if pending and IMAGE_CACHE is not None:
+            _trim_image_cache()
+        return exposures
+
     def get_bytes(self):
-        # Check if cached JPEG exists
+        if self._preview is not None:
+            return self._preview
+
+        # Use the cached JPEG unless the image was written after it
         jpeg_cache_path = f"{self.path}_preview.jpg"
-        if os.path.exists(jpeg_cache_path):
+        if os.path.exists(jpeg_cache_path) and (
+            not os.path.exists(self.image_path)
+            or os.path.getmtime(jpeg_cache_path) >= os.path.getmtime(self.image_path)
+        ):
             with open(jpeg_cache_path, 'rb') as f:
                 frame_bytes = f.read()
-            return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
+        else:
+            frame_bytes = self._encode_preview()
 
-        # Generate and cache JPEG
-        if self.image is None:
-            self.load_image()
+            # Cache to disk
+            with open(jpeg_cache_path, 'wb') as f:
+                f.write(frame_bytes)
+
+        # Keep the multipart frame so later calls return without any I/O
+        self._preview = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
+        return self._preview
+
+    def _encode_preview(self) -> bytes:
+        # Generate JPEG, from the full image if already loaded
+        image = self.image if self.image is not None else self.load_image(preview=True)
 
         # Resize for faster loading (max 1920px wide)
-        height, width = self.image.shape[:2]
+        height, width = image.shape[:2]
         if width > 1920:
             scale = 1920 / width
             new_width = 1920
             new_height = int(height * scale)
-            image_resized = cv2.resize(self.image, (new_width, new_height))
+            image_resized = cv2.resize(image, (new_width, new_height))
         else:
-            image_resized = self.image
+            image_resized = image
 
-        # Convert RGB to BGR for OpenCV
-        image_bgr = cv2.cvtColor(image_resized, cv2.COLOR_RGB2BGR)
-        ret, buffer = cv2.imencode(".jpg", image_bgr, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        if not ret:
+        # RGB is encoded as is, no channel swap with libjpeg-turbo
+        frame_bytes = encode_jpeg(image_resized, quality=85, rgb=True)
+        if frame_bytes is None:
             raise Exception("Failed to encode image as JPEG")
-        frame_bytes = buffer.tobytes()
-
-        # Cache to disk
-        with open(jpeg_cache_path, 'wb') as f:
-            f.write(frame_bytes)
-
-        return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
+        return frame_bytes
 
     def load_image_shape(self):
         if "image_shape" not in self.data:
-            shape = self.load_image().shape
+            if self.image is not None:
+                shape = self.image.shape
+            elif self._image_cache_valid():
+                shape = self.load_image().shape
+            else:
+                # Output size from the raw header, no demosaicing needed
+                with rawpy.imread(f"{self.image_path}") as raw:
+                    sizes = raw.sizes
+                height, width = sizes.height, sizes.width
+                if sizes.flip in (5, 6):  # rotated by 90 degrees
+                    height, width = width, height
+                shape = (height, width, 3)
             self.data["image_shape"] = shape
             self.export_data()
 
         return self.data["image_shape"]
 
-    def get_metadata(self) -> None:
-        with exiftool.ExifToolHelper() as et:
-            self.data["exif"] = et.get_metadata(self.image_path)[0]
+    def get_metadata(self, exif: dict = None) -> None:
+        # exif may be passed in when it was read for a batch of files at once
+        self.data["exif"] = exif if exif is not None else _get_exif(self.image_path)
 
         # Get pixel size
         res = self.data["exif"]["EXIF:FocalPlaneXResolution"]
@@ -101,53 +485,122 @@ class Exposure:
         time = time.replace(":", "-", 2)
         time = time.replace(" ", "T")
         self.data["time_iso"] = time
-        self.time = time
 
     def export_data(self):
-        with open(f"{self.path}.json", "w") as f:
-            json.dump(self.data, f, indent=4)
+        if HAS_ORJSON:
+            encoded = orjson.dumps(self.data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            encoded = json.dumps(self.data, indent=4).encode()
 
-    def import_data(self):
+        # Skip the write if the sidecar already holds this data
+        if encoded == self._exported:
+            return
+
+        # Write to a temporary file and rename so readers never see a partial sidecar
+        json_path = f"{self.path}.json"
+        tmp_path = f"{json_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp_path, json_path)
+        self._exported = encoded
+
+    def import_data(self, exif: dict = None):
         # Check if cached metadata exists
         json_path = f"{self.path}.json"
         if os.path.exists(json_path):
-            with open(json_path, 'r') as f:
-                self.data = json.load(f)
+            with open(json_path, 'rb') as f:
+                encoded = f.read()
+            self.data = orjson.loads(encoded) if HAS_ORJSON else json.loads(encoded)
+            self._exported = encoded
         else:
-            self.get_metadata()
+            self.get_metadata(exif)
             self.export_data()
 
+    @classmethod
+    def from_paths(cls, paths) -> list:
+        """
+        Create exposures for many files, reading EXIF for all of them in one exiftool request.
+
+        Files that already have a metadata sidecar are not sent to exiftool.
+
+        Args:
+            paths: Raw file paths
+
+        Returns:
+            List of Exposure objects
+        """
+        def sidecar(path):
+            abs_path = os.path.abspath(path)
+            stub = os.path.basename(abs_path).split(".")[0]
+            return f"{os.path.dirname(abs_path)}/{stub}.json"
+
+        missing = [path for path in paths if not os.path.exists(sidecar(path))]
+        exifs = dict(zip(missing, _get_exif_many(missing))) if missing else {}
+        return [cls(path, exifs.get(path)) for path in paths]
+
     def make_xyls(self):
+        self._xyls_hdu().writeto(f"{self.path}.xyls", overwrite=True)
+
+    def _xyls_hdu(self):
+        columns = []
+        if self.flux is not None:
+            # Brightest first, solve-field tries quads in file order
+            order = np.argsort(self.flux)[::-1]
+            self.sources_x = self.sources_x[order]
+            self.sources_y = self.sources_y[order]
+            self.fwhm = self.fwhm[order]
+            self.flux = self.flux[order]
+            columns.append(fits.Column(name="FLUX", format="E", array=self.flux))
+
         # Create FITS table
-        col1 = fits.Column(name="X", format="D", array=self.sources[:, 0])
-        col2 = fits.Column(name="Y", format="D", array=self.sources[:, 1])
+        col1 = fits.Column(name="X", format="D", array=self.sources_x)
+        col2 = fits.Column(name="Y", format="D", array=self.sources_y)
         col3 = fits.Column(name="FWHM", format="E", array=self.fwhm)
-        hdu = fits.BinTableHDU.from_columns([col1, col2, col3])
+        hdu = fits.BinTableHDU.from_columns([col1, col2, col3] + columns)
 
         # Add required headers
-        hdu.header["IMAGEW"] = int(self.image.shape[1])
-        hdu.header["IMAGEH"] = int(self.image.shape[0])
-        hdu.writeto(f"{self.path}.xyls", overwrite=True)
+        # Full resolution size, also right when detection ran on a half size decode
+        height, width = self.load_image_shape()[:2]
+        hdu.header["IMAGEW"] = int(width)
+        hdu.header["IMAGEH"] = int(height)
+        return hdu
 
     def radec_radius(self):
-        height, width = self.image.shape[:2]
-        centre = tuple(
-            x.item() for x in self.wcs.pixel_to_world_values(width // 2 - 1, height // 2 - 1)
+        height, width = self.load_image_shape()[:2]
+        # Centre and corner projected together in one WCS evaluation
+        ras, decs = self.wcs.pixel_to_world_values(
+            np.array([width // 2 - 1, 0]), np.array([height // 2 - 1, 0])
         )
-        corner = tuple(x.item() for x in self.wcs.pixel_to_world_values(0, 0))
 
-        centre_sc = SkyCoord(*centre, unit="deg")
-        corner_sc = SkyCoord(*corner, unit="deg")
-        radius = 2 * centre_sc.separation(corner_sc).degree
-        self.ra = centre[0]
-        self.dec = centre[1]
+        points = SkyCoord(ras, decs, unit="deg")
+        radius = 2 * points[0].separation(points[1]).degree
+        self.ra = float(ras[0])
+        self.dec = float(decs[0])
         self.radius = radius
 
-        return (centre[0], centre[1], radius)
+        return (self.ra, self.dec, radius)
 
     def radec(self):
-        height, width = self.image.shape[:2]
-        return self.wcs.pixel_to_world(width // 2 - 1, height // 2 - 1)
+        if self._radec is None:
+            height, width = self.load_image_shape()[:2]
+            self._radec = self.wcs.pixel_to_world(width // 2 - 1, height // 2 - 1)
+        return self._radec
+
+    def altaz(self, location: EarthLocation, obstime: Time):
+        # Alt/Az of the image centre as seen from location at obstime
+        key = (
+            location.x.value,
+            location.y.value,
+            location.z.value,
+            obstime.scale,
+            float(obstime.jd1),
+            float(obstime.jd2),
+        )
+        altaz = self._altaz.get(key)
+        if altaz is None:
+            altaz = self.radec().transform_to(AltAz(obstime=obstime, location=location))
+            self._altaz[key] = altaz
+        return altaz
 
     def load_all(self):
         self.load_image()
@@ -156,21 +609,104 @@ class Exposure:
 
     def load_wcs(self):
         try:
-            self.wcs = WCS(fits.getheader(f"{self.path}.wcs"))
+            self._set_wcs(WCS(fits.getheader(f"{self.path}.wcs")))
         except Exception:
             return None
         return None
 
+    def _set_wcs(self, wcs):
+        self.wcs = wcs
+        self._radec = None
+        self._altaz.clear()
+
     def load_xyls(self):
         try:
             xyls = fits.getdata(f"{self.path}.xyls")
-            self.sources = np.array((xyls["X"], xyls["Y"])).T
+            self.sources_x = np.ascontiguousarray(xyls["X"], dtype=np.float64)
+            self.sources_y = np.ascontiguousarray(xyls["Y"], dtype=np.float64)
             self.fwhm = np.array((xyls["FWHM"])).T
+            self.flux = np.array(xyls["FLUX"]) if "FLUX" in xyls.names else None
         except Exception:
             return None
         return None
 
+    def pixel_scale(self):
+        # Arcseconds per pixel from the pixel size (um) and the focal length (mm)
+        focal_length = self.data.get("exif", {}).get("EXIF:FocalLength")
+        pixel_size = self.data.get("pixel_size")
+        if not focal_length or not pixel_size:
+            return None
+        return 206.265 * pixel_size / focal_length
+
     def plate_solve(self, ra=None, dec=None, radius=None):
+        # Without an explicit position, start from the last solve, usually the same target
+        hint = Exposure.last_solution if ra is None and dec is None else None
+        if hint is not None:
+            solved = self._solve_field(*hint) or self._solve_field()
+        else:
+            solved = self._solve_field(ra, dec, radius)
+
+        if not solved:
+            return None
+
+        Exposure.last_solution = self.radec_radius()
+        return self.wcs
+
+    def plate_solve_http(self, url, ra=None, dec=None, radius=None, timeout=60):
+        """
+        Plate solve against a persistent Astrometry.net solver over HTTP.
+
+        The source list is posted as in-memory FITS bytes, so no solve-field
+        process or temporary files are needed. The server is expected to reply
+        with the solved WCS as FITS header text.
+
+        Args:
+            url: Solver endpoint
+            ra: Optional RA hint in degrees
+            dec: Optional Dec hint in degrees
+            radius: Optional search radius in degrees
+            timeout: Request timeout in seconds
+
+        Returns:
+            WCS of the solution or None
+        """
+        if ra is None and dec is None and Exposure.last_solution is not None:
+            ra, dec, radius = Exposure.last_solution
+
+        params = {}
+        if ra is not None:
+            params["ra"] = f"{ra:.6f}"
+        if dec is not None:
+            params["dec"] = f"{dec:.6f}"
+        if radius is not None:
+            params["radius"] = f"{radius:.2f}"
+        scale = self.pixel_scale()
+        if scale is not None:
+            params["scale_low"] = f"{scale * 0.9:.3f}"
+            params["scale_high"] = f"{scale * 1.1:.3f}"
+
+        buf = io.BytesIO()
+        self._xyls_hdu().writeto(buf)
+        request = urllib.request.Request(
+            f"{url}?{urllib.parse.urlencode(params)}" if params else url,
+            data=buf.getvalue(),
+            headers={"Content-Type": "application/fits"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as resp:
+                header = fits.Header.fromstring(resp.read().decode("ascii", errors="replace"))
+            wcs = WCS(header)
+        except Exception as e:
+            print(f"HTTP plate solve failed: {e}")
+            return None
+
+        if not wcs.has_celestial:
+            return None
+        self._set_wcs(wcs)
+        Exposure.last_solution = self.radec_radius()
+        return self.wcs
+
+    def _solve_field(self, ra=None, dec=None, radius=None):
         # perform plate solve
         command = ["solve-field", f"{self.path}.xyls", "--overwrite", "--wcs", f"{self.path}.wcs"]
         if ra is not None:
@@ -179,59 +715,204 @@ class Exposure:
             command += ["--dec", f"{dec:.6f}"]
         if radius is not None:
             command += ["--radius", f"{radius:.2f}"]
+
+        # Bound the index scales searched to +/-10% of the expected pixel scale
+        scale = self.pixel_scale()
+        if scale is not None:
+            command += ["--scale-units", "arcsecperpix"]
+            command += ["--scale-low", f"{scale * 0.9:.3f}"]
+            command += ["--scale-high", f"{scale * 1.1:.3f}"]
+
+        command += ["--depth", "20"]
+        command += ["--cpulimit", "30"]
         command += ["--no-plots"]
         command += ["--no-remove-lines"]
         command += ["--corr", "none"]
         command += ["--match", "none"]
         command += ["--rdls", "none"]
+        os.makedirs(SOLVE_SCRATCH, exist_ok=True)
+        command += ["--dir", SOLVE_SCRATCH, "--temp-dir", SOLVE_SCRATCH]
 
-        result = subprocess.run(
+        # Discard the solver log, stderr is only decoded when the solve fails
+        env = dict(os.environ, OMP_NUM_THREADS=str(os.cpu_count() or 1))
+        proc = subprocess.Popen(
             command,
-            capture_output=True,
-            text=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            env=env,
         )
+        _, err = proc.communicate()
 
-        if result.returncode != 0:
-            print(result.stdout)
+        if proc.returncode != 0:
+            print(err.decode(errors="replace"))
             print(" ".join(command))
-            return None
+            return False
 
         self.load_wcs()
-        self.radec_radius()
-        return self.wcs
+        return self.wcs is not None
 
     def blobs(self, **kwargs):
+        # method "doh" for an accurate source catalogue, "dog" for fast focus and framing,
+        # "peak" for positions only as fast as possible
+        method = kwargs.pop("method", "doh")
+        # Detect on an image shrunk by this factor, results are scaled back to full size
+        downsample = kwargs.pop("downsample", 1)
+        tile = kwargs.pop("tile", BLOB_TILE)
+        # Detect on rawpy's half size decode, skipping the full demosaic for plate solving
+        half_size = kwargs.pop("half_size", False)
+
         # pull target image
-        target_channel = kwargs.get("target_channel", "green")
+        target_channel = kwargs.pop("target_channel", "green")
+
+        # Detection is deterministic, skip it when nothing has changed since the last call
+        key = (method, downsample, tile, half_size, target_channel, tuple(sorted(kwargs.items())))
+        if self._blobs_key is not None:
+            image, sources_x, last_key = self._blobs_key
+            if image is self.image and sources_x is self.sources_x and last_key == key:
+                return self._blobs
+
+        if half_size:
+            with rawpy.imread(self.image_path) as raw:
+                image = raw.postprocess(half_size=True)
+        else:
+            image = self.image
+
         match target_channel:
             case "red":
-                target = self.image[:, :, 0]
+                target = image[:, :, 0]
             case "green":
-                target = self.image[:, :, 1]
+                target = image[:, :, 1]
             case "blue":
-                target = self.image[:, :, 2]
+                target = image[:, :, 2]
             case "mean":
-                target = self.image.mean(axis=2)
+                target = self.get_mono() if image is self.image else _channel_mean(image)
+
+        if downsample > 1:
+            target = cv2.resize(
+                target, None, fx=1 / downsample, fy=1 / downsample, interpolation=cv2.INTER_AREA
+            )
+
+        # Overall factor between detection pixels and full resolution pixels
+        scale = downsample * (2 if half_size else 1)
+        kwargs.setdefault("min_sigma", 10 / scale)
+
+        as_float = img_as_float32
+        match method:
+            case "doh":
+                cpu, gpu = blob_doh, blob_doh_gpu if HAS_CUCIM else None
+                # Its Hessian is read off an integral image, float32 sums lose the detail
+                as_float = img_as_float64
+            case "dog":
+                cpu, gpu = blob_dog, blob_dog_gpu if HAS_CUCIM else None
+                kwargs.setdefault("sigma_ratio", 1.6)
+                # skimage's default of 0.5 misses all but saturated stars
+                kwargs.setdefault("threshold", 0.05)
+            case "peak":
+                cpu, gpu = blob_peaks, None
+                # Thresholds against whole-image statistics, and is fast enough untiled
+                tile = None
+            case _:
+                raise Exception(f"Unknown blob detection method: {method}")
+
+        # skimage would promote to float64, float32 halves the bytes the Gaussian filters read
+        detect = as_float(target)
+        if method == "dog" and target.dtype.kind == "f" and image.dtype.kind in "ui":
+            # The channel mean keeps the image's integer scale, dog's threshold is for [0, 1]
+            full_scale = np.float32(1 / np.iinfo(image.dtype).max)
+            detect = np.multiply(detect, full_scale, dtype=np.float32)
+        if gpu is not None:
+            # Same detector on the GPU, only the image and the result cross the bus
+            blobs = cp.asnumpy(gpu(cp.asarray(detect), **kwargs))
+        elif tile and max(detect.shape) > tile:
+            # Cache-sized tiles detected on a thread pool
+            blobs = _blobs_tiled(cpu, detect, tile, **kwargs)
+        else:
+            blobs = cpu(detect, **kwargs)
+
+        # Background subtracted sum over each blob's box, a flux proxy to order sources by
+        self.flux = _box_flux(target, blobs)
 
-        kwargs.setdefault("min_sigma", 10)
+        if scale > 1:
+            # Map pixel centres and sigma back to the full resolution image
+            blobs[:, :2] = (blobs[:, :2] + 0.5) * scale - 0.5
+            blobs[:, 2] *= scale
 
-        blobs = blob_doh(target, **kwargs)
         self.fwhm = blobs[:, 2]
-        self.sources = blobs[:, [1, 0]]
+        self.sources_x = np.ascontiguousarray(blobs[:, 1])
+        self.sources_y = np.ascontiguousarray(blobs[:, 0])
         self.make_xyls()
+        self._blobs = blobs
+        self._blobs_key = (self.image, self.sources_x, key)
         return blobs
 
+    def render_centroids_jpeg(self, quality: int = 85) -> bytes:
+        # Web preview of the detected sources drawn with OpenCV, no matplotlib figure
+        if self.sources is None:
+            raise Exception("No sources")
+
+        # Draw on a preview sized copy (max 1920px wide), scaling the sources to match
+        height, width = self.image.shape[:2]
+        scale = min(1.0, 1920 / width)
+        if scale < 1.0:
+            size = (1920, int(height * scale))
+            image = cv2.resize(self.image, size, interpolation=cv2.INTER_AREA)
+        else:
+            # The image may be a read-only memory map, the circles need a writable copy
+            image = self.image.copy()
+
+        # Drawn straight onto the RGB pixels, the encoder takes RGB input as is
+        for (x, y), fwhm in zip(self.sources * scale, np.asarray(self.fwhm) * scale):
+            centre = (int(round(x)), int(round(y)))
+            cv2.circle(image, centre, max(1, int(round(fwhm))), (255, 0, 0), 2)
+
+        jpg = encode_jpeg(image, quality=quality, rgb=True)
+        if jpg is None:
+            raise Exception("Failed to encode image as JPEG")
+        return jpg
+
     def plot_star_centroids(self, **kwargs):
         if self.sources is None:
             print("No sources")
             return
 
-        positions = self.sources
+        self._draw_star_centroids(plt.gca())
+        plt.show()
 
-        apertures = [CircularAperture([pos], r=fwhm) for pos, fwhm in zip(positions, self.fwhm)]
+    def render_centroid_plot(self, quality: int = 85) -> bytes:
+        # The plot_star_centroids figure as JPEG, drawn on a reused off-screen figure
+        if self.sources is None:
+            raise Exception("No sources")
+
+        with _plot_lock:
+            ax = _get_plot_axes()
+            ax.clear()
+            self._draw_star_centroids(ax)
+            canvas = ax.figure.canvas
+            canvas.draw()
+            rgb = np.asarray(canvas.buffer_rgba())[:, :, :3]
+            jpg = encode_jpeg(rgb, quality=quality, rgb=True)
+
+        if jpg is None:
+            raise Exception("Failed to encode image as JPEG")
+        return jpg
 
-        plt.title(f"Sources: {len(self.sources)}")
-        plt.imshow(self.image)
-        for aperture in apertures:
-            aperture.plot(color="red", lw=1.5, alpha=0.5)
-        plt.show()
+    def _draw_star_centroids(self, ax):
+        positions = self.sources
+
+        # One collection for every star rather than an aperture artist each
+        diameters = 2 * np.asarray(self.fwhm)
+        ax.set_title(f"Sources: {len(positions)}")
+        ax.imshow(self.image)
+        apertures = EllipseCollection(
+            widths=diameters,
+            heights=diameters,
+            angles=0,
+            units="xy",
+            offsets=positions,
+            offset_transform=ax.transData,
+            facecolor="none",
+            edgecolor="red",
+            linewidth=1.5,
+            alpha=0.5,
+        )
+        ax.add_collection(apertures)
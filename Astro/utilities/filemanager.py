@@ -1,43 +1,75 @@
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+import bisect
 import os
-from astropy.table import QTable, Column
-from astropy.time import Time
+import threading
+from functools import cached_property
 
 
 class FileManager:
     def __init__(self, extension: str, watch_path: str = '.'):
         self.extension = extension
         self.watch_path = watch_path
-        self.files: list[str] = [
-            f for f in os.listdir(watch_path) if f.endswith(extension)
-        ]
-        self.files.sort()
+        self.lock = threading.Lock()
+        # Notified on every addition, wakes streams waiting for a new file
+        self.new_file = threading.Condition(self.lock)
+        self.files: list[str] = self._scan()
         print(self.files)
 
         self.observer = Observer()
         self.observer.schedule(FileHandler(self), path=watch_path, recursive=False)
         self.observer.start()
 
-        self.data = QTable()
-        self.data["Image"] = Column([], dtype=str)
-        self.data["Time"] = Column([], dtype=Time)
+    @cached_property
+    def data(self):
+        # Built on first use, importing astropy.table costs several hundred ms of startup
+        from astropy.table import QTable, Column
+        from astropy.time import Time
+
+        data = QTable()
+        data["Image"] = Column([], dtype=str)
+        data["Time"] = Column([], dtype=Time)
+        return data
+
+    def _scan(self) -> list[str]:
+        """List matching files in the watch path, sorted by name."""
+        # scandir returns the entry type with the name, no stat per file
+        with os.scandir(self.watch_path) as entries:
+            files = [e.name for e in entries if e.name.endswith(self.extension) and e.is_file()]
+        files.sort()
+        return files
 
     def refresh(self):
         """Manually refresh the file list from disk."""
-        self.files = [
-            f for f in os.listdir(self.watch_path) if f.endswith(self.extension)
-        ]
-        self.files.sort()
+        files = self._scan()
+        with self.lock:
+            self.files = files
+            self.new_file.notify_all()
 
     def get_latest(self):
-        # Refresh the file list to catch any missed events
-        self.refresh()
+        # The list is kept current by watchdog (inotify on Linux), no directory scan needed
+        with self.lock:
+            return self.files[-1] if self.files else None
+
+    def wait_for_change(self, last: str, timeout: float = None):
+        """Block until the latest file differs from last, or timeout expires. Returns the latest."""
+        with self.new_file:
+            self.new_file.wait_for(lambda: (self.files[-1] if self.files else None) != last, timeout)
+            return self.files[-1] if self.files else None
+
+    def add(self, filename: str):
+        # The list stays sorted, so binary search replaces the scan and re-sort
+        with self.lock:
+            i = bisect.bisect_left(self.files, filename)
+            if i == len(self.files) or self.files[i] != filename:
+                self.files.insert(i, filename)
+                self.new_file.notify_all()
 
-        if not self.files:
-            return None
-        self.files.sort()
-        return self.files[-1]
+    def remove(self, filename: str):
+        with self.lock:
+            i = bisect.bisect_left(self.files, filename)
+            if i < len(self.files) and self.files[i] == filename:
+                del self.files[i]
 
 
 class FileHandler(FileSystemEventHandler):
@@ -51,6 +83,20 @@ class FileHandler(FileSystemEventHandler):
 
         filename = os.path.basename(event.src_path)
         if filename.endswith(self.manager.extension):
-            self.manager.files.append(filename)
-            self.manager.files.sort()
+            self.manager.add(filename)
             print(self.manager.files)
+
+    def on_deleted(self, event):
+        if event.is_directory:
+            return
+
+        self.manager.remove(os.path.basename(event.src_path))
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+
+        self.manager.remove(os.path.basename(event.src_path))
+        filename = os.path.basename(event.dest_path)
+        if filename.endswith(self.manager.extension):
+            self.manager.add(filename)
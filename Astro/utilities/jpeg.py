@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+from functools import lru_cache
+from typing import Optional
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_RGB, TJSAMP_420
+
+    HAS_TURBOJPEG = True
+except ImportError:
+    HAS_TURBOJPEG = False
+
+
+@lru_cache(maxsize=None)
+def turbojpeg() -> Optional["TurboJPEG"]:
+    """
+    Get the shared libjpeg-turbo handle.
+
+    Returns:
+        TurboJPEG instance, or None if PyTurboJPEG or libturbojpeg is missing
+    """
+    if HAS_TURBOJPEG:
+        try:
+            return TurboJPEG()
+        except (OSError, RuntimeError):
+            print("Warning: libturbojpeg not found. Using OpenCV JPEG codec.")
+    return None
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 85, rgb: bool = False) -> Optional[bytes]:
+    """
+    Encode an image as baseline JPEG.
+
+    libjpeg-turbo takes RGB input as is, so RGB images skip the channel swap
+    OpenCV needs.
+
+    Args:
+        image: 8-bit colour image
+        quality: JPEG quality
+        rgb: True if the channels are RGB rather than OpenCV's BGR
+
+    Returns:
+        Encoded JPEG bytes, or None if encoding failed
+    """
+    tj = turbojpeg()
+    if tj is not None:
+        return tj.encode(
+            np.ascontiguousarray(image),
+            quality=quality,
+            pixel_format=TJPF_RGB if rgb else TJPF_BGR,
+            jpeg_subsample=TJSAMP_420,
+        )
+
+    if rgb:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    params = [
+        cv2.IMWRITE_JPEG_QUALITY,
+        quality,
+        cv2.IMWRITE_JPEG_OPTIMIZE,
+        0,
+        cv2.IMWRITE_JPEG_PROGRESSIVE,
+        0,
+    ]
+    ret, buffer = cv2.imencode(".jpg", image, params)
+    if not ret:
+        return None
+    return buffer.tobytes()
@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+import rawpy
+
+
+def decode_preview(file: str) -> np.ndarray:
+    """
+    Decode a raw file to a BGR preview at most 1920 pixels wide.
+
+    Module level in a module of its own, so a worker process imports only this.
+
+    Args:
+        file: Path to the raw file
+
+    Returns:
+        Preview image as a BGR numpy array
+    """
+    # Half-size decoding skips demosaicing, the preview is downscaled anyway
+    with rawpy.imread(file) as raw:
+        image = raw.postprocess(
+            use_camera_wb=True,
+            half_size=True,
+            no_auto_bright=False,
+            output_bps=8,
+        )
+
+    height, width = image.shape[:2]
+    if width > 1920:
+        scale = 1920 / width
+        new_width = 1920
+        new_height = int(height * scale)
+        image_resized = cv2.resize(image, (new_width, new_height))
+    else:
+        image_resized = image
+
+    return cv2.cvtColor(image_resized, cv2.COLOR_RGB2BGR)
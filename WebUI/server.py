@@ -7,22 +7,39 @@ Provides a browser interface for viewing camera stream and measuring star FWHM.
 import cv2
 import numpy as np
 import os
-from flask import Flask, Response, render_template, jsonify, request, send_file
+from flask import Flask, Response, render_template, jsonify, request
+from werkzeug.wsgi import ClosingIterator
 import threading
-from io import BytesIO
+import time
+from functools import lru_cache
 
-from Astro.hardware import Camera, CameraStream
-from Astro.utilities import calculate_fwhm, draw_star_overlay, FWHMTracker
+from Astro.hardware import Camera
+from Astro.services import CameraStream
+from Astro.utilities import calculate_fwhm_1d, draw_star_overlay, encode_jpeg, FWHMTracker
+from Astro.utilities.analysis import warm_up
 
 try:
     import rawpy
-    import imageio
 
     HAS_RAWPY = True
 except ImportError:
     HAS_RAWPY = False
     print("Warning: rawpy not installed. CR3 preview not available.")
 
+try:
+    import waitress
+
+    HAS_WAITRESS = True
+except ImportError:
+    HAS_WAITRESS = False
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Get the directory where this file is located
 WEBUI_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -46,76 +63,209 @@ measurement_state = {
 }
 state_lock = threading.Lock()
 
+# Open /video_feed streams allowed at once, each holds a waitress thread for its lifetime.
+# Viewers beyond this are refused with a 503, so the /api routes always keep API_THREADS.
+MAX_VIEWERS = int(os.environ.get("ASTRO_MAX_VIEWERS", "8"))
+API_THREADS = 8
+# Worker threads for waitress
+WSGI_THREADS = MAX_VIEWERS + API_THREADS
+_viewer_slots = threading.BoundedSemaphore(MAX_VIEWERS)
+
+# File types listed by /api/list_captures
+CAPTURE_EXTENSIONS = (".cr3", ".cr2", ".nef", ".arw", ".jpg", ".jpeg", ".png")
+# Last capture listing, reused until the directory's mtime changes
+_capture_cache = {"mtime": None, "images": []}
+
+# Multipart framing yielded around each JPEG, so the payload itself is never concatenated
+FRAME_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+FRAME_TRAILER = b"\r\n"
+
 
 def process_frame(frame):
     """Process a frame for FWHM measurement and update state."""
     with state_lock:
-        measurement_state["latest_frame"] = frame.copy()
-
         if measurement_state["frame_width"] is None:
             measurement_state["frame_width"] = frame.shape[1]
             measurement_state["frame_height"] = frame.shape[0]
 
         star_pos = measurement_state["star_pos"]
+        box_size = measurement_state["box_size"]
 
-        if star_pos:
-            x, y = star_pos
-            fwhm = calculate_fwhm(frame, x, y, measurement_state["box_size"])
+    # Fit without the lock, so the encoder can draw and publish frames meanwhile
+    fwhm = None
+    if star_pos:
+        x, y = star_pos
+        # Row and column fits, cheap enough to run on every frame
+        fwhm = calculate_fwhm_1d(frame, x, y, box_size)
+
+    with state_lock:
+        # Stream frames are read-only and never reused while referenced, no copy needed
+        measurement_state["latest_frame"] = frame
+        # Drop a result for a star deselected or changed while the fit ran
+        if fwhm is not None and measurement_state["star_pos"] == star_pos:
+            measurement_state["fwhm_tracker"].add_measurement(fwhm)
+
+
+def _placeholder_jpeg():
+    """Encode the frame shown while no stream is available."""
+    blank = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(
+        blank,
+        "No Stream Available",
+        (150, 240),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        1,
+        (255, 255, 255),
+        2,
+    )
+    return encode_jpeg(blank, quality=85)
+
+
+# The placeholder never changes, encode it once
+PLACEHOLDER_JPEG = _placeholder_jpeg()
+# Seconds between placeholder frames while the camera is stopped
+PLACEHOLDER_INTERVAL_S = 0.5
+
+
+# Latest encoded stream frame shared by every /video_feed client, seq counts frames
+_latest = {"jpeg": None, "seq": 0}
+_latest_cond = threading.Condition()
+_encoder_thread = None
+_measure_thread = None
+_encoder_lock = threading.Lock()
+# Newest frame waiting for FWHM measurement, the encoder overwrites it if the fit lags
+_measure = {"frame": None}
+_measure_cond = threading.Condition()
+# Set by /api/camera/start, wakes the idle encoder instead of it polling the stream
+stream_started = threading.Event()
+# Seconds the idle encoder waits before re-checking a stream that stopped on its own
+STREAM_IDLE_CHECK_S = 5.0
+
+
+def measure_frames():
+    """Run the FWHM measurement on the newest frame, alongside drawing and encoding."""
+    while True:
+        with _measure_cond:
+            _measure_cond.wait_for(lambda: _measure["frame"] is not None)
+            frame = _measure["frame"]
+            _measure["frame"] = None
 
-            if fwhm is not None:
-                measurement_state["fwhm_tracker"].add_measurement(fwhm)
+        try:
+            process_frame(frame)
+        except Exception as e:
+            print(f"Error measuring frame: {e}")
 
 
-def generate_frames():
-    """Generator function for video streaming."""
-    global camera_stream
+def encode_frames():
+    """Measure, annotate and encode each camera frame once for all viewers."""
+    overlay = None  # reused buffer the overlay is drawn into
+    # JIT the fit kernels before the first frame rather than on it
+    warm_up()
 
     while True:
-        if camera_stream is None or not camera_stream.is_running():
-            # Send a placeholder frame
-            blank = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(
-                blank,
-                "No Stream Available",
-                (150, 240),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                1,
-                (255, 255, 255),
-                2,
+        try:
+            overlay = _encode_frame(overlay)
+        except Exception as e:
+            # Keep serving viewers, one bad frame must not end the shared encoder
+            print(f"Error encoding frame: {e}")
+            time.sleep(PLACEHOLDER_INTERVAL_S)
+
+
+def _encode_frame(overlay):
+    """
+    Wait for one camera frame, then hand it to measurement and publish its JPEG.
+
+    Args:
+        overlay: Buffer the overlay was last drawn into, or None
+
+    Returns:
+        The overlay buffer to reuse for the next frame
+    """
+    stream = camera_stream
+    if stream is None or not stream.is_running():
+        stream_started.wait(timeout=STREAM_IDLE_CHECK_S)
+        stream_started.clear()
+        return overlay
+
+    frame = stream.get_frame(timeout=1.0)
+    if frame is None:
+        return overlay
+
+    # Hand the frame to the measurement thread, the overlay shows the latest result
+    with _measure_cond:
+        _measure["frame"] = frame
+        _measure_cond.notify()
+
+    # Draw overlay
+    with state_lock:
+        star_pos = measurement_state["star_pos"]
+        current_fwhm = measurement_state["fwhm_tracker"].get_current()
+
+        if star_pos:
+            if overlay is None or overlay.shape != frame.shape:
+                overlay = np.empty_like(frame)
+            display_frame = draw_star_overlay(
+                frame,
+                star_pos[0],
+                star_pos[1],
+                current_fwhm,
+                measurement_state["box_size"],
+                out=overlay,
             )
-            ret, buffer = cv2.imencode(".jpg", blank)
-            frame_bytes = buffer.tobytes()
-            yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n")
-            continue
+        else:
+            display_frame = frame
 
-        frame = camera_stream.get_frame(timeout=1.0)
-        if frame is None:
-            continue
+    # Encode frame as JPEG, libjpeg-turbo when available
+    frame_bytes = encode_jpeg(display_frame, quality=85)
+    if frame_bytes is None:
+        return overlay
+
+    with _latest_cond:
+        _latest["jpeg"] = frame_bytes
+        _latest["seq"] += 1
+        _latest_cond.notify_all()
 
-        # Process frame for FWHM measurement
-        process_frame(frame)
+    return overlay
 
-        # Draw overlay
-        with state_lock:
-            star_pos = measurement_state["star_pos"]
-            current_fwhm = measurement_state["fwhm_tracker"].get_current()
 
-            if star_pos:
-                display_frame = draw_star_overlay(
-                    frame, star_pos[0], star_pos[1], current_fwhm, measurement_state["box_size"]
-                )
-            else:
-                display_frame = frame
+def start_encoder():
+    """Start the shared encoder and measurement threads if they are not running yet."""
+    global _encoder_thread, _measure_thread
+    with _encoder_lock:
+        # Also replaces a thread that died, so a viewer never waits on a dead encoder
+        if _measure_thread is None or not _measure_thread.is_alive():
+            _measure_thread = threading.Thread(target=measure_frames, daemon=True)
+            _measure_thread.start()
+        if _encoder_thread is None or not _encoder_thread.is_alive():
+            _encoder_thread = threading.Thread(target=encode_frames, daemon=True)
+            _encoder_thread.start()
 
-        # Encode frame as JPEG
-        ret, buffer = cv2.imencode(".jpg", display_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        if not ret:
+
+def generate_frames():
+    """Generator function for video streaming."""
+    start_encoder()
+    seen = _latest["seq"]
+
+    while True:
+        if camera_stream is None or not camera_stream.is_running():
+            # Send a placeholder frame
+            yield FRAME_HEADER
+            yield PLACEHOLDER_JPEG
+            yield FRAME_TRAILER
+            time.sleep(PLACEHOLDER_INTERVAL_S)
             continue
 
-        frame_bytes = buffer.tobytes()
+        # Wait for the encoder to publish a frame this client has not sent yet
+        with _latest_cond:
+            if not _latest_cond.wait_for(lambda: _latest["seq"] != seen, timeout=1.0):
+                continue
+            frame_bytes = _latest["jpeg"]
+            seen = _latest["seq"]
 
-        # Yield frame in multipart format
-        yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n")
+        # Yield frame in multipart format, the WSGI server writes each chunk as is
+        yield FRAME_HEADER
+        yield frame_bytes
+        yield FRAME_TRAILER
 
 
 @app.route("/")
@@ -126,8 +276,18 @@ def index():
 
 @app.route("/video_feed")
 def video_feed():
-    """Video streaming route."""
-    return Response(generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
+    """Video streaming route, up to MAX_VIEWERS at once."""
+    if not _viewer_slots.acquire(blocking=False):
+        return Response("Too many viewers", status=503, headers={"Retry-After": "5"})
+
+    # The WSGI server closes the iterator when the client disconnects, even before the
+    # first frame. Response.call_on_close is skipped for direct passthrough.
+    frames = ClosingIterator(generate_frames(), _viewer_slots.release)
+    return Response(
+        frames,
+        mimetype="multipart/x-mixed-replace; boundary=frame",
+        direct_passthrough=True,
+    )
 
 
 @app.route("/api/select_star", methods=["POST"])
@@ -160,6 +320,10 @@ def fwhm_data():
             "frame_height": measurement_state["frame_height"],
         }
 
+    # Polled continuously by the page, orjson encodes numpy floats without conversion
+    if HAS_ORJSON:
+        body = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+        return Response(body, mimetype="application/json")
     return jsonify(data)
 
 
@@ -173,6 +337,7 @@ def start_camera():
 
     camera_stream = CameraStream(camera)
     if camera_stream.start():
+        stream_started.set()
         return jsonify({"success": True})
     else:
         camera_stream = None
@@ -208,6 +373,45 @@ def camera_status():
     return jsonify({"running": is_running})
 
 
+@lru_cache(maxsize=32)
+def _raw_preview(filename, mtime_ns):
+    """
+    Build the JPEG preview of a raw file, cached per file and modification time.
+
+    Args:
+        filename: Path to the raw file
+        mtime_ns: Modification time, so a rewritten file gets a new preview
+
+    Returns:
+        JPEG bytes
+    """
+    # Opening only parses the container, the mosaic is not read unless postprocess runs
+    with rawpy.imread(filename) as raw:
+        # Extract embedded preview (fast)
+        try:
+            thumb = raw.extract_thumb()
+            if thumb.format == rawpy.ThumbFormat.JPEG:
+                # Return the embedded JPEG directly
+                return thumb.data
+            if thumb.format == rawpy.ThumbFormat.BITMAP:
+                return encode_jpeg(thumb.data, quality=85, rgb=True)
+        except Exception:
+            pass
+
+        # If no preview, process the raw data (slower but better quality)
+        rgb = raw.postprocess(
+            use_camera_wb=True,
+            half_size=True,  # Faster processing
+            no_auto_bright=False,
+            output_bps=8,
+        )
+
+    jpg = encode_jpeg(rgb, quality=85, rgb=True)
+    if jpg is None:
+        raise Exception("Failed to encode image as JPEG")
+    return jpg
+
+
 @app.route("/api/preview_raw/<path:filename>")
 def preview_raw(filename):
     """
@@ -220,31 +424,8 @@ def preview_raw(filename):
         return jsonify({"error": "rawpy not installed"}), 500
 
     try:
-        # Open the raw file
-        with rawpy.imread(filename) as raw:
-            # Extract embedded JPEG preview (fast)
-            try:
-                thumb = raw.extract_thumb()
-                if thumb.format == rawpy.ThumbFormat.JPEG:
-                    # Return the embedded JPEG directly
-                    return Response(thumb.data, mimetype="image/jpeg")
-            except Exception:
-                pass
-
-            # If no preview, process the raw data (slower but better quality)
-            rgb = raw.postprocess(
-                use_camera_wb=True,
-                half_size=True,  # Faster processing
-                no_auto_bright=False,
-                output_bps=8,
-            )
-
-            # Convert to JPEG
-            img_io = BytesIO()
-            imageio.imwrite(img_io, rgb, format="JPEG", quality=85)
-            img_io.seek(0)
-
-            return send_file(img_io, mimetype="image/jpeg")
+        jpg = _raw_preview(filename, os.stat(filename).st_mtime_ns)
+        return Response(jpg, mimetype="image/jpeg")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -256,15 +437,23 @@ def list_captures():
     # You can customize this path
     capture_dir = os.path.join(os.path.dirname(WEBUI_DIR), "captures")
 
-    if not os.path.exists(capture_dir):
+    try:
+        mtime = os.stat(capture_dir).st_mtime_ns
+    except FileNotFoundError:
         return jsonify({"images": []})
 
-    images = []
-    for filename in os.listdir(capture_dir):
-        if filename.lower().endswith((".cr3", ".cr2", ".nef", ".arw", ".jpg", ".jpeg", ".png")):
-            images.append({"filename": filename, "path": os.path.join(capture_dir, filename)})
+    # Adding, removing or renaming a file updates the directory mtime
+    if mtime != _capture_cache["mtime"]:
+        with os.scandir(capture_dir) as entries:
+            images = [
+                {"filename": entry.name, "path": entry.path}
+                for entry in entries
+                if entry.name.lower().endswith(CAPTURE_EXTENSIONS)
+            ]
+        _capture_cache["images"] = images
+        _capture_cache["mtime"] = mtime
 
-    return jsonify({"images": images})
+    return jsonify({"images": _capture_cache["images"]})
 
 
 def cleanup():
@@ -281,7 +470,7 @@ def run_server(host="0.0.0.0", port=5000, debug=True):
     Args:
         host: Host address to bind to
         port: Port number to listen on
-        debug: Enable Flask debug mode
+        debug: Enable Flask debug mode, otherwise serve with waitress when installed
     """
     import atexit
 
@@ -291,6 +480,10 @@ def run_server(host="0.0.0.0", port=5000, debug=True):
     print(f"Open http://localhost:{port} in your browser")
     if debug:
         print("Debug mode enabled - server will auto-reload on file changes")
+    elif HAS_WAITRESS:
+        # Production WSGI server, writes each yielded chunk without Werkzeug's dev wrappers
+        waitress.serve(app, host=host, port=port, threads=WSGI_THREADS)
+        return
 
     app.run(host=host, port=port, debug=debug, threaded=True)
 
@@ -0,0 +1,78 @@
+import unittest
+import warnings
+
+import numpy as np
+from scipy.optimize import OptimizeWarning
+
+from Astro.utilities.analysis import calculate_fwhm, calculate_fwhm_1d, gaussian_2d
+
+
+def star_box(sigma_x, sigma_y, theta=0.0, amplitude=1000.0, noise=5.0, seed=0, size=60):
+    """Synthetic star at (30.3, 29.6) on a background of 100 with Gaussian noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:size, :size].astype(float)
+    image = gaussian_2d((x, y), amplitude, 30.3, 29.6, sigma_x, sigma_y, theta, 100.0)
+    return image.reshape(size, size) + rng.normal(0, noise, (size, size))
+
+
+def true_fwhm(sigma_x, sigma_y):
+    return 2.355 * (sigma_x + sigma_y) / 2
+
+
+class CalculateFWHMTest(unittest.TestCase):
+    def setUp(self):
+        warnings.simplefilter("ignore", OptimizeWarning)
+
+    def test_rotated_elongated_star(self):
+        # The axis-aligned fit reads these narrow, the rotated fit must be used
+        for sigma_x, sigma_y, theta in ((3.0, 1.5, 0.7), (4.0, 2.0, 0.3)):
+            fwhm = calculate_fwhm(star_box(sigma_x, sigma_y, theta), 30, 30)
+            self.assertAlmostEqual(fwhm, true_fwhm(sigma_x, sigma_y), delta=0.05)
+
+    def test_round_star(self):
+        fwhm = calculate_fwhm(star_box(3.0, 3.0), 30, 30)
+        self.assertAlmostEqual(fwhm, true_fwhm(3.0, 3.0), delta=0.05)
+
+
+class CalculateFWHM1DTest(unittest.TestCase):
+    def setUp(self):
+        warnings.simplefilter("ignore", OptimizeWarning)
+
+    def test_round_star(self):
+        fwhm = calculate_fwhm_1d(star_box(3.0, 3.0), 30, 30)
+        self.assertAlmostEqual(fwhm, true_fwhm(3.0, 3.0), delta=0.1)
+
+    def test_faint_star(self):
+        truth = true_fwhm(2.5, 2.5)
+        results = [
+            calculate_fwhm_1d(star_box(2.5, 2.5, amplitude=40.0, seed=seed), 30, 30)
+            for seed in range(40)
+        ]
+        self.assertNotIn(None, results)
+        self.assertAlmostEqual(np.mean(results), truth, delta=0.1 * truth)
+        # Scatter comparable to the 2D fit's on the same boxes
+        reference = [
+            calculate_fwhm(star_box(2.5, 2.5, amplitude=40.0, seed=seed), 30, 30)
+            for seed in range(40)
+        ]
+        self.assertLess(np.std(results), 1.5 * np.std(reference))
+
+    def test_elongated_star(self):
+        for theta in (0.0, np.pi / 4):
+            fwhm = calculate_fwhm_1d(star_box(2.5, 4.0, theta), 30, 30)
+            self.assertAlmostEqual(fwhm, true_fwhm(2.5, 4.0), delta=0.1 * true_fwhm(2.5, 4.0))
+
+    def test_star_near_box_edge(self):
+        # Centre passed well off the star, which sits near the edge of the box
+        fwhm = calculate_fwhm_1d(star_box(3.0, 3.0), 45, 42)
+        self.assertAlmostEqual(fwhm, true_fwhm(3.0, 3.0), delta=0.2)
+
+    def test_empty_box(self):
+        self.assertIsNone(calculate_fwhm_1d(np.full((60, 60), 100.0), 30, 30))
+        for seed in range(50):
+            noise = np.random.default_rng(seed).normal(100, 5, (60, 60))
+            self.assertIsNone(calculate_fwhm_1d(noise, 30, 30))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from skimage.feature import blob_doh
+
+from Astro.utilities import exposure
+from Astro.utilities.exposure import Exposure
+
+
+def star_field(size=200, stars=8, seed=1):
+    """uint8 RGB frame of round stars of varied brightness and colour on a noisy sky."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:size, :size]
+    image = rng.normal(20, 2, (size, size, 3))
+    for _ in range(stars):
+        cx, cy = rng.uniform(30, size - 30, 2)
+        amplitude, sigma = rng.uniform(3, 120), rng.uniform(8, 14)
+        profile = amplitude * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * sigma**2))
+        image += profile[..., None] * rng.uniform(0.5, 1.5, 3)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+class BlobsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # A metadata sidecar, so the exposure is built without a raw file or exiftool
+        with open(os.path.join(self.tmp.name, "frame.json"), "w") as f:
+            f.write("{}")
+        self.exposure = Exposure(os.path.join(self.tmp.name, "frame.CR3"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_mean_channel_matches_baseline_count(self):
+        image = star_field()
+        # The original detection: blob_doh on the float64 channel mean
+        expected = len(blob_doh(image.mean(axis=2), min_sigma=10))
+        self.assertGreater(expected, 0)
+
+        self.exposure.image = image
+        blobs = self.exposure.blobs(target_channel="mean")
+        self.assertEqual(len(blobs), expected)
+
+    def test_dog_mean_channel_uses_unit_scale(self):
+        # Grey stars, so the channel mean equals the green channel pixel for pixel
+        image = np.repeat(star_field(size=300, stars=10, seed=3)[..., 1:2], 3, axis=2)
+        self.exposure.image = image
+        green = self.exposure.blobs(method="dog", target_channel="green")
+        mean = self.exposure.blobs(method="dog", target_channel="mean")
+        self.assertGreater(len(green), 0)
+        self.assertEqual(len(mean), len(green))
+
+
+class ImageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = os.path.join(self.tmp.name, "cache")
+        for stub in ("a", "b"):
+            with open(os.path.join(self.tmp.name, f"{stub}.json"), "w") as f:
+                f.write("{}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def exposure(self, stub):
+        return Exposure(os.path.join(self.tmp.name, f"{stub}.CR3"))
+
+    def test_off_by_default(self):
+        with mock.patch.object(exposure, "IMAGE_CACHE", None):
+            e = self.exposure("a")
+            e.image = np.zeros((4, 4, 3), np.uint8)
+            e._save_image_cache()
+            self.assertFalse(e._image_cache_valid())
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["a.json", "b.json"])
+
+    def test_cached_image_is_writable(self):
+        with mock.patch.object(exposure, "IMAGE_CACHE", self.cache):
+            e = self.exposure("a")
+            e.image = np.full((4, 4, 3), 7, np.uint8)
+            e._save_image_cache()
+            image = self.exposure("a").load_image()
+            image[0, 0] = 0
+            # Copy-on-write, the cache file keeps the decoded image
+            self.assertEqual(self.exposure("a").load_image()[0, 0, 0], 7)
+
+    def test_oldest_removed_beyond_limit(self):
+        image = np.zeros((100, 100, 3), np.uint8)
+        with mock.patch.multiple(exposure, IMAGE_CACHE=self.cache, IMAGE_CACHE_MAX_BYTES=40000):
+            old, new = self.exposure("a"), self.exposure("b")
+            old.image = new.image = image
+            old._save_image_cache()
+            os.utime(old._image_cache_path(), (0, 0))
+            new._save_image_cache()
+            self.assertFalse(os.path.exists(old._image_cache_path()))
+            self.assertTrue(new._image_cache_valid())
+
+
+if __name__ == "__main__":
+    unittest.main()
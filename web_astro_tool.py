@@ -3,7 +3,9 @@
 Launcher for web-based Live FWHM measurement tool.
 """
 
-from WebGUI import run_server
-
 if __name__ == '__main__':
+    # Imported here, not at module level: spawned raw decode workers re-import this
+    # file, and importing the server builds the camera, file watcher and streams
+    from WebGUI import run_server
+
     run_server(host='0.0.0.0', port=5000, debug=True)